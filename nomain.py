@@ -5,14 +5,130 @@ MCP servers communicate via stdio, not HTTP
 """
 
 import os
+import re
+import sys
+import csv
 import json
+import math
+import time
+import queue
+import random
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import hashlib
+import atexit
 import asyncio
+import signal
+import sqlite3
+import tempfile
+import contextlib
+import contextvars
 import subprocess
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from email.utils import parsedate_to_datetime
+import heapq
+import importlib.util
 import httpx
 import logging
+import logging.handlers
 import argparse
 
+try:
+    import numpy as np
+except ImportError:  # ranking falls back to pure Python
+    np = None
+
+try:
+    import orjson
+except ImportError:  # the JSON codec falls back to msgspec or the stdlib
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+class JSONCodec:
+    """Bytes-in, bytes-out JSON used on the MCP transport and for CLI/service output
+
+    The stdlib implementation is the fallback; OrjsonCodec and MsgspecCodec
+    skip the str round trip. loads() accepts bytes, bytearray or str and raises
+    ValueError on bad input whichever backend is in use.
+    """
+
+    name = "json"
+
+    def dumps(self, obj, indent: bool = False) -> bytes:
+        if indent:
+            return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        return json.loads(data)
+
+class OrjsonCodec(JSONCodec):
+    name = "orjson"
+
+    def dumps(self, obj, indent: bool = False) -> bytes:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+        except TypeError:
+            # Integers beyond 64 bits, non-str keys and the like
+            return super().dumps(obj, indent)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+class MsgspecCodec(JSONCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj, indent: bool = False) -> bytes:
+        try:
+            data = self._encoder.encode(obj)
+        except (TypeError, OverflowError, msgspec.EncodeError):
+            return super().dumps(obj, indent)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+    def loads(self, data):
+        try:
+            return self._decoder.decode(data.encode('utf-8') if isinstance(data, str) else data)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+def select_json_codec(name: str = "auto") -> JSONCodec:
+    """Pick a JSON codec by name; 'auto' prefers orjson, then msgspec, then the stdlib"""
+    available = {"orjson": OrjsonCodec if orjson else None,
+                 "msgspec": MsgspecCodec if msgspec else None,
+                 "json": JSONCodec}
+    if name == "auto":
+        return next(codec() for codec in available.values() if codec is not None)
+    if name not in available:
+        raise ValueError(f"Unknown JSON codec: {name}")
+    if available[name] is None:
+        raise RuntimeError(f"JSON codec {name} is not installed (pip install {name})")
+    return available[name]()
+
+json_codec = select_json_codec()
+
+def write_json_line(out, obj):
+    """Write one compact JSON line, as bytes when the stream has a binary buffer, and flush"""
+    line = json_codec.dumps(obj) + b'\n'
+    if hasattr(out, 'buffer'):
+        out.buffer.write(line)
+        out.buffer.flush()
+    else:
+        out.write(line.decode('utf-8'))
+        out.flush()
+
 def load_env_file(filename=".env"):
     """Load environment variables from .env file directly"""
     env_vars = {}
@@ -27,49 +143,696 @@ def load_env_file(filename=".env"):
                     env_vars[key.strip()] = value.strip().strip('"').strip("'")
     return env_vars
 
-def setup_logging(log_level='INFO'):
-    """Configure logging with specified level"""
+# Per-stage fields (request_id, stage, ...) attached to every record logged in the current task
+_log_fields = contextvars.ContextVar('log_fields', default={})
+LOG_FIELDS = ('request_id', 'stage', 'duration_ms')
+
+@contextlib.contextmanager
+def log_fields(**fields):
+    """Attach fields such as request_id or stage to records logged inside the block (task-local)"""
+    token = _log_fields.set({**_log_fields.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_fields.reset(token)
+
+class LogFieldsFilter(logging.Filter):
+    """Copies the task-local log fields onto the record, unless passed explicitly via extra="""
+
+    def filter(self, record):
+        for key, value in _log_fields.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class DebugSampler(logging.Filter):
+    """Keeps a fraction of DEBUG records so high-volume debug events don't swamp the queue"""
+
+    def __init__(self, rate: float = 1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+class TextLogFormatter(logging.Formatter):
+    """The classic format, with any per-stage fields appended"""
+
+    def format(self, record):
+        text = super().format(record)
+        fields = [f"{key}={getattr(record, key)}" for key in LOG_FIELDS if hasattr(record, key)]
+        return f"{text} [{' '.join(fields)}]" if fields else text
+
+class JSONLogFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, per-stage fields and exception"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update({key: getattr(record, key) for key in LOG_FIELDS if hasattr(record, key)})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json_codec.dumps(entry).decode('utf-8')
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler for an in-process queue: enqueues the record as-is
+
+    The stock prepare() formats the message (running every argument's
+    __str__) and flattens exc_info on the calling thread so records can be
+    pickled; records on a SimpleQueue never are, so all formatting is left
+    to the listener thread and exc_info survives for the formatters.
+    """
+
+    def prepare(self, record):
+        return record
+
+_log_listener = None
+
+def stop_logging():
+    """Flush queued records and stop the logging thread"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+def setup_logging(log_level='INFO', log_format='text', debug_sample_rate: float = 1.0):
+    """Configure logging with specified level
+
+    Records go through a LocalQueueHandler, so callers (the event loop
+    included) only filter and enqueue; a QueueListener thread formats them,
+    arguments and tracebacks included, and writes to stderr.
+    """
+    global _log_listener
     level = getattr(logging, log_level.upper(), logging.INFO)
-    logging.basicConfig(
-        level=level,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler()
-        ]
-    )
+    stop_logging()
+
+    stream_handler = logging.StreamHandler()
+    if log_format == 'json':
+        stream_handler.setFormatter(JSONLogFormatter())
+    else:
+        stream_handler.setFormatter(TextLogFormatter('%(asctime)s - %(levelname)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LocalQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(debug_sample_rate))
+    queue_handler.addFilter(LogFieldsFilter())
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _log_listener.start()
     return logging.getLogger(__name__)
 
+atexit.register(stop_logging)
+
+logger = logging.getLogger(__name__)
+# Full JSON-RPC payloads, logged at DEBUG only; silence it separately when they are too noisy
+payload_logger = logging.getLogger(f"{__name__}.payloads")
+
+class LatencyHistogram:
+    """HDR-style latency histogram: log-linear microsecond buckets with under 1% relative error
+
+    Each value is rounded down to its top 8 significant bits, so memory stays
+    bounded (a few hundred buckets per power of two) however many samples are
+    recorded, and percentiles come out within one bucket width.
+    """
+
+    SIGNIFICANT_BITS = 8
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total_us = 0
+        self.min_us = None
+        self.max_us = 0
+
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1e6))
+        shift = max(0, value.bit_length() - self.SIGNIFICANT_BITS)
+        key = value >> shift << shift
+        self.buckets[key] = self.buckets.get(key, 0) + 1
+        self.count += 1
+        self.total_us += value
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+        self.max_us = max(self.max_us, value)
+
+    def percentile(self, q: float) -> float:
+        """Value in seconds at or below which q percent of the samples fall (bucket upper bound)"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for key in sorted(self.buckets):
+            seen += self.buckets[key]
+            if seen >= target:
+                width = 1 << max(0, key.bit_length() - self.SIGNIFICANT_BITS)
+                return min(key + width - 1, self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def summary(self) -> dict:
+        """Count plus mean, p50, p95, p99 and max in milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_us / self.count / 1e3, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1e3, 3),
+            "p95_ms": round(self.percentile(95) * 1e3, 3),
+            "p99_ms": round(self.percentile(99) * 1e3, 3),
+            "max_ms": round(self.max_us / 1e3, 3)
+        }
+
+class StageTimer:
+    """Span/timer API aggregating stage durations into one LatencyHistogram per stage name"""
+
+    def __init__(self):
+        self.histograms = {}
+
+    def record(self, name: str, seconds: float):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        histogram.record(seconds)
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Time the block as stage `name`; records logged inside it carry stage=name"""
+        start = time.perf_counter()
+        try:
+            with log_fields(stage=name):
+                yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.record(name, elapsed)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("⏱️  %s took %.1f ms", name, elapsed * 1e3,
+                             extra={"stage": name, "duration_ms": round(elapsed * 1e3, 3)})
+
+    async def timed(self, name: str, awaitable):
+        """Await under a span, for stages that run concurrently (e.g. inside asyncio.gather)"""
+        with self.span(name):
+            return await awaitable
+
+    def summary(self) -> dict:
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def report(self) -> str:
+        """Fixed-width table of every stage, slowest p99 first"""
+        rows = sorted(self.summary().items(), key=lambda item: -item[1]["p99_ms"])
+        lines = [f"{'stage':<28} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)"]
+        for name, stats in rows:
+            lines.append(f"{name:<28} {stats['count']:>7} {stats['mean_ms']:>9.1f} {stats['p50_ms']:>9.1f} "
+                         f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+        return '\n'.join(lines)
+
+timings = StageTimer()
+
+class Metric:
+    """One Prometheus counter or gauge, with a value per label combination"""
+
+    def __init__(self, name: str, kind: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def value(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+def _prometheus_labels(pairs) -> str:
+    """Render label pairs as {name="value",...}, escaping backslashes, quotes and newlines"""
+    rendered = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        rendered.append(f'{name}="{value}"')
+    return '{' + ','.join(rendered) + '}' if rendered else ''
+
+def _prometheus_value(value) -> str:
+    """Render a sample value losslessly: integers as-is, floats via repr"""
+    if isinstance(value, int) or (isinstance(value, float) and value.is_integer() and abs(value) < 2 ** 53):
+        return str(int(value))
+    return repr(float(value))
+
+class MetricsRegistry:
+    """Counters and gauges shared by the MCP and Mistral clients, in Prometheus text format"""
+
+    def __init__(self, prefix: str = "tabletalk"):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _metric(self, kind: str, name: str, help_text: str, labelnames: tuple) -> Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = Metric(f"{self.prefix}_{name}", kind, help_text, labelnames)
+        elif metric.kind != kind or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind} "
+                             f"with labels {metric.labelnames}")
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Metric:
+        """Return the counter `name`, registering it on first use"""
+        return self._metric("counter", name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Metric:
+        """Return the gauge `name`, registering it on first use"""
+        return self._metric("gauge", name, help_text, labelnames)
+
+    def exposition(self, timer: StageTimer = None) -> str:
+        """Text exposition format 0.0.4; stage latencies from `timer` are rendered as summaries"""
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda metric: metric.name):
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for key, value in sorted(metric.values.items()):
+                lines.append(f"{metric.name}{_prometheus_labels(zip(metric.labelnames, key))} {_prometheus_value(value)}")
+        if timer is not None and timer.histograms:
+            name = f"{self.prefix}_stage_duration_seconds"
+            lines.append(f"# HELP {name} Pipeline stage and MCP request latency")
+            lines.append(f"# TYPE {name} summary")
+            for stage, histogram in sorted(timer.histograms.items()):
+                for quantile in (0.5, 0.95, 0.99):
+                    labels = _prometheus_labels([("stage", stage), ("quantile", quantile)])
+                    lines.append(f"{name}{labels} {_prometheus_value(histogram.percentile(quantile * 100))}")
+                labels = _prometheus_labels([("stage", stage)])
+                lines.append(f"{name}_sum{labels} {_prometheus_value(histogram.total_us / 1e6)}")
+                lines.append(f"{name}_count{labels} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+metrics_registry = MetricsRegistry()
+
 # Load environment variables from .env file
 env_vars = load_env_file()
 
+def default_cache_dir():
+    """Directory for on-disk caches, following XDG_CACHE_HOME"""
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "tabletalk"
+
+class ToolCatalogCache:
+    """On-disk cache of the MCP tools/list result, keyed by server name and version
+
+    FastMCP servers report the mcp SDK version rather than their own, so an
+    upgraded server can keep the same key; entries therefore also expire
+    after `ttl` seconds.
+    """
+
+    def __init__(self, path=None, ttl: float = 24 * 3600):
+        self.path = Path(path) if path else default_cache_dir() / "mcp_tools.json"
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(server_info: dict):
+        name = server_info.get('name')
+        version = server_info.get('version')
+        if not name or not version:
+            return None
+        return f"{name}@{version}"
+
+    def _read_all(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                catalog = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return catalog if isinstance(catalog, dict) else {}
+
+    def load(self, server_info: dict):
+        """Return cached tools for this server version, or None when missing or expired"""
+        key = self._key(server_info)
+        if key is None:
+            return None
+        entry = self._read_all().get(key)
+        # Entries written before expiry was added are bare lists; treat them as stale
+        if not isinstance(entry, dict) or time.time() - entry.get('fetchedAt', 0) > self.ttl:
+            return None
+        return entry.get('tools')
+
+    def store(self, server_info: dict, tools: list):
+        """Persist the tool catalogue for this server version"""
+        key = self._key(server_info)
+        if key is None:
+            return
+        catalog = self._read_all()
+        catalog[key] = {"fetchedAt": time.time(), "tools": tools}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique temp file per writer, so concurrent cold runs don't clobber each other
+            with tempfile.NamedTemporaryFile('w', dir=self.path.parent, prefix=self.path.name,
+                                             suffix='.tmp', delete=False) as f:
+                json.dump(catalog, f)
+            os.replace(f.name, self.path)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not write tool catalogue cache {self.path}: {e}")
+
+_JSON_SCHEMA_TYPES = {
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+}
+
+def validate_tool_arguments(tool: dict, arguments: dict):
+    """Check arguments against the tool's inputSchema (required keys and top-level types)"""
+    schema = tool.get('inputSchema') or {}
+    missing = [key for key in schema.get('required', []) if key not in arguments]
+    if missing:
+        raise ValueError(f"Tool {tool['name']} missing required arguments: {', '.join(missing)}")
+    for key, value in arguments.items():
+        expected = schema.get('properties', {}).get(key, {}).get('type')
+        python_type = _JSON_SCHEMA_TYPES.get(expected)
+        if python_type is None:
+            continue
+        if isinstance(value, bool) and expected != "boolean":
+            raise ValueError(f"Tool {tool['name']} argument {key} must be {expected}, got boolean")
+        if not isinstance(value, python_type):
+            raise ValueError(f"Tool {tool['name']} argument {key} must be {expected}, got {type(value).__name__}")
+
+def call_key(name: str, arguments: dict) -> str:
+    """Stable hash of a tool name plus canonicalized arguments"""
+    canonical = json.dumps([name, arguments], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class SingleFlight:
+    """Lets concurrent identical calls share one in-flight task
+
+    The shared task is only cancelled once every waiter has gone away, so a
+    single impatient caller cannot cancel the work for the others. The task is
+    built by the first caller's factory, so that caller's options (such as a
+    request timeout) apply to every coalesced waiter.
+    """
+
+    def __init__(self, metrics: MetricsRegistry = None):
+        self.coalesced = 0
+        self._calls = {}
+        self._coalesced_total = (metrics or metrics_registry).counter(
+            "singleflight_coalesced_total", "Calls that joined an identical in-flight call")
+
+    async def do(self, key: str, factory):
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(factory())
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda _: self._calls.pop(key, None) if self._calls.get(key) is entry else None)
+        else:
+            self.coalesced += 1
+            self._coalesced_total.inc()
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and entry[1] == 1:
+                # Forget the dying task first so new callers start a fresh one
+                if self._calls.get(key) is entry:
+                    del self._calls[key]
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+
+class LoggedPayload:
+    """Serializes a message only when a log record is formatted, truncated to max_chars"""
+
+    __slots__ = ('message', 'max_chars')
+
+    def __init__(self, message, max_chars: int = 2000):
+        self.message = message
+        self.max_chars = max_chars
+
+    def __str__(self):
+        text = json_codec.dumps(self.message).decode('utf-8', errors='replace')
+        if self.max_chars and len(text) > self.max_chars:
+            return f"{text[:self.max_chars]}... ({len(text)} chars)"
+        return text
+
 class MCPOSMClient:
-    def __init__(self):
+    def __init__(self, stderr_buffer_lines: int = 100, stderr_log_rate: int = 20,
+                 stream_limit: int = 1024 * 1024, max_message_size: int = 64 * 1024 * 1024,
+                 request_timeout: float = 30.0, debug_payload_chars: int = 2000,
+                 debug_payload_sample_rate: float = 1.0, metrics: MetricsRegistry = None,
+                 command: tuple = ('uvx', 'osm-mcp-server')):
         self.process = None
+        self.command = tuple(command)
+        self.request_timeout = request_timeout
+        self.server_info = {}
+        self.tools = {}
+        # Set while self.tools came from a ToolCatalogCache that may be stale
+        self._tool_cache = None
+        self._tools_from_cache = False
+        self.metrics = metrics or metrics_registry
+        self._single_flight = SingleFlight(self.metrics)
+        self._requests_total = self.metrics.counter(
+            "mcp_requests_total", "MCP JSON-RPC requests sent", ("method",))
+        self._request_errors_total = self.metrics.counter(
+            "mcp_request_errors_total", "MCP requests that failed, by reason", ("method", "reason"))
+        self._in_flight = self.metrics.gauge("mcp_in_flight_requests", "MCP requests awaiting a response")
+        self._cache_hits_total = self.metrics.counter("cache_hits_total", "Cache lookups answered", ("cache",))
+        self._cache_misses_total = self.metrics.counter("cache_misses_total", "Cache lookups missed", ("cache",))
+        self.stream_limit = stream_limit
+        self.max_message_size = max_message_size
+        self._request_id = 0
+        self._pending = {}
+        self._reader_task = None
+        self._stderr_task = None
+        self._write_lock = asyncio.Lock()
+        self._stderr_lines = deque(maxlen=stderr_buffer_lines)
+        self._stderr_log_rate = stderr_log_rate
+        self.debug_payload_chars = debug_payload_chars
+        self.debug_payload_sample_rate = debug_payload_sample_rate
 
     async def connect_to_server(self):
         """Connect to existing MCP OSM server"""
         try:
             # Start a new connection to the MCP server
             self.process = await asyncio.create_subprocess_exec(
-                'uvx', 'osm-mcp-server',
+                *self.command,
                 stdin=asyncio.subprocess.PIPE,
                 stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stderr=asyncio.subprocess.PIPE,
+                limit=self.stream_limit
             )
+            self._reader_task = asyncio.create_task(self._read_responses())
+            self._stderr_task = asyncio.create_task(self._drain_stderr())
             logger.info("✅ Connected to MCP OSM server")
         except Exception as e:
             logger.error(f"❌ Failed to connect to MCP server: {e}")
             return False
         return True
 
-    async def send_request(self, method: str, params: dict, request_id: int = None):
-        """Send a JSON-RPC request to the MCP server"""
+    async def _drain_stderr(self):
+        """Continuously consume server stderr so a chatty server never blocks on a full pipe"""
+        window_start = time.monotonic()
+        logged = suppressed = 0
+        while True:
+            try:
+                line = await self.process.stderr.readline()
+            except ValueError:
+                # Over-long line: the reader already discarded it
+                line = b'<stderr line exceeded buffer limit>\n'
+            if not line:
+                break
+            text = line.decode(errors='replace').rstrip()
+            self._stderr_lines.append(text)
+
+            now = time.monotonic()
+            if now - window_start >= 1.0:
+                if suppressed:
+                    logger.debug("🪵 osm-mcp-server: %d stderr lines suppressed", suppressed)
+                window_start, logged, suppressed = now, 0, 0
+            if logged < self._stderr_log_rate:
+                logged += 1
+                logger.debug("🪵 osm-mcp-server: %s", text)
+            else:
+                suppressed += 1
+
+    def _log_payload(self, direction: str, message: dict):
+        """Log a JSON-RPC message on the payload logger, truncated and sampled
+
+        Nothing is serialized unless DEBUG is enabled for the payload logger and
+        the message is picked by debug_payload_sample_rate.
+        """
+        if not payload_logger.isEnabledFor(logging.DEBUG):
+            return
+        if self.debug_payload_sample_rate < 1.0 and random.random() >= self.debug_payload_sample_rate:
+            return
+        payload_logger.debug("%s %s", direction, LoggedPayload(message, self.debug_payload_chars))
+
+    def recent_stderr(self) -> str:
+        """Return the last buffered stderr lines of the server"""
+        return '\n'.join(self._stderr_lines)
+
+    def _with_stderr(self, message: str) -> str:
+        """Append the buffered server stderr to an error message"""
+        if self._stderr_lines:
+            message += f"; last stderr lines:\n{self.recent_stderr()}"
+        return message
+
+    async def _write_message(self, message: dict):
+        """Write a single JSON-RPC message to the server's stdin"""
+        data = json_codec.dumps(message) + b'\n'
+        async with self._write_lock:
+            self.process.stdin.write(data)
+            await self.process.stdin.drain()
+
+    async def _read_frame(self):
+        """Read one newline-delimited message, growing past the stream limit in chunks
+
+        Frames that fit the StreamReader limit come back as a single bytes object;
+        larger ones are accumulated into one bytearray instead of failing like readline().
+        Returns b'' at EOF.
+        """
+        stream = self.process.stdout
+        frame = None
+        while True:
+            try:
+                chunk = await stream.readuntil(b'\n')
+            except asyncio.IncompleteReadError as e:
+                if frame is None and not e.partial:
+                    return b''
+                raise ConnectionError("MCP server closed its stdout mid-message")
+            except asyncio.LimitOverrunError as e:
+                chunk = await stream.readexactly(e.consumed)
+                if frame is None:
+                    frame = bytearray(chunk)
+                else:
+                    frame += chunk
+                if len(frame) > self.max_message_size:
+                    await self._discard_oversized_frame(frame)
+                    frame = None
+                continue
+            if frame is None:
+                return chunk
+            frame += chunk
+            return frame
+
+    async def _discard_oversized_frame(self, head: bytearray):
+        """Skip the rest of a message exceeding max_message_size and fail its caller"""
+        stream = self.process.stdout
+        while True:
+            try:
+                await stream.readuntil(b'\n')
+                break
+            except asyncio.LimitOverrunError as e:
+                await stream.readexactly(e.consumed)
+            except asyncio.IncompleteReadError:
+                break
+
+        error = ValueError(f"MCP message exceeded max_message_size ({self.max_message_size} bytes)")
+        logger.error(f"❌ {error}")
+        match = re.search(rb'"id"\s*:\s*(\d+)', bytes(head[:256]))
+        if match:
+            request_id = int(match.group(1))
+        elif len(self._pending) == 1:
+            # Only one request can be waiting for it
+            request_id = next(iter(self._pending))
+        else:
+            logger.error(f"❌ Could not attribute the oversized message to one of {len(self._pending)} "
+                         "pending requests; they will wait for their deadline")
+            return
+        future = self._pending.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    async def _read_responses(self):
+        """Background task dispatching server messages to pending requests by id"""
+        try:
+            while True:
+                response_line = await self._read_frame()
+                if not response_line:
+                    break
+                try:
+                    message = json_codec.loads(response_line)
+                except ValueError:
+                    logger.warning(f"⚠️  Ignoring non-JSON line from MCP server: {bytes(response_line[:200])!r}")
+                    continue
+                if not isinstance(message, dict):
+                    logger.warning(f"⚠️  Ignoring non-object JSON message from MCP server: "
+                                   f"{bytes(response_line[:200])!r}")
+                    continue
+
+                if isinstance(message.get('id'), (int, str)) and ('result' in message or 'error' in message):
+                    future = self._pending.pop(message['id'], None)
+                    if future is None:
+                        # Late answers to timed-out or cancelled requests end up here
+                        logger.debug("Dropping response for unknown or cancelled request id %s", message['id'])
+                    elif not future.done():
+                        future.set_result(message)
+                else:
+                    # Server-initiated notifications and requests are not part of any call
+                    logger.debug("📨 Server message: %s", message.get('method'))
+        except Exception as e:
+            logger.error(f"❌ MCP response reader failed: {e}")
+            self._fail_pending(e)
+            return
+        self._fail_pending(ConnectionError(self._with_stderr("MCP server closed its stdout")))
+
+    def _fail_pending(self, exc: Exception):
+        """Fail every outstanding request with the given exception"""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(exc)
+
+    def _send_cancelled_notification(self, request_id: int, reason: str):
+        """Tell the server to stop working on a request we no longer wait for
+
+        The line is written without awaiting drain so it can be sent from a
+        cancelled task; a single write() never interleaves with other messages.
+        """
+        if not self.process or self.process.returncode is not None or self.process.stdin.is_closing():
+            return
+        notification = {
+            "jsonrpc": "2.0",
+            "method": "notifications/cancelled",
+            "params": {
+                "requestId": request_id,
+                "reason": reason
+            }
+        }
+        self._log_payload("📤 Sending notification:", notification)
+        self.process.stdin.write(json_codec.dumps(notification) + b'\n')
+
+    async def send_request(self, method: str, params: dict, request_id: int = None, timeout: float = None):
+        """Send a JSON-RPC request to the MCP server and await its response
+
+        timeout overrides the client's request_timeout; on expiry or task
+        cancellation the server is sent notifications/cancelled.
+        """
         if not self.process:
             raise RuntimeError("MCP server not started")
+        if self._reader_task is None or self._reader_task.done():
+            raise ConnectionError("MCP server connection is closed")
 
         if request_id is None:
-            request_id = getattr(self, '_request_id', 0) + 1
-            self._request_id = request_id
+            self._request_id += 1
+            request_id = self._request_id
+        elif request_id in self._pending:
+            raise ValueError(f"Request id {request_id} is already in flight")
 
         request = {
             "jsonrpc": "2.0",
@@ -78,15 +841,45 @@ class MCPOSMClient:
             "params": params
         }
 
-        request_json = json.dumps(request) + '\n'
-        logger.debug(f"📤 Sending: {request_json.strip()}")
-        self.process.stdin.write(request_json.encode())
-        await self.process.stdin.drain()
+        if timeout is None:
+            timeout = self.request_timeout
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._requests_total.inc(method=method)
+        self._in_flight.inc()
+        try:
+            self._log_payload("📤 Sending:", request)
+
+            async def exchange():
+                # The write is inside the deadline too: a server that stopped
+                # reading stdin would otherwise block drain() forever
+                await self._write_message(request)
+                return await future
+
+            with timings.span(f"mcp.{method}"):
+                response = await asyncio.wait_for(exchange(), timeout)
+        except asyncio.TimeoutError:
+            self._request_errors_total.inc(method=method, reason="timeout")
+            if method != "initialize":
+                self._send_cancelled_notification(request_id, f"Timed out after {timeout}s")
+            raise asyncio.TimeoutError(self._with_stderr(
+                f"MCP request {method} (id {request_id}) timed out after {timeout}s"))
+        except asyncio.CancelledError:
+            self._request_errors_total.inc(method=method, reason="cancelled")
+            if method != "initialize":
+                self._send_cancelled_notification(request_id, "Cancelled by client")
+            raise
+        except Exception:
+            self._request_errors_total.inc(method=method, reason="transport")
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+            self._in_flight.dec()
 
-        # Read response
-        response_line = await self.process.stdout.readline()
-        response = json.loads(response_line.decode())
-        logger.debug(f"📥 Received: {json.dumps(response, indent=2)}")
+        if 'error' in response:
+            self._request_errors_total.inc(method=method, reason="rpc_error")
+        self._log_payload("📥 Received:", response)
         return response
 
     async def initialize(self):
@@ -101,179 +894,2018 @@ class MCPOSMClient:
                 "version": "1.0.0"
             }
         }
-        response = await self.send_request("initialize", init_request, 1)
+        response = await self.send_request("initialize", init_request)
 
         # Send initialized notification after successful init
         if 'result' in response:
+            self.server_info = response['result'].get('serverInfo', {})
             initialized_notification = {
                 "jsonrpc": "2.0",
                 "method": "notifications/initialized",
                 "params": {}
             }
-            notification_json = json.dumps(initialized_notification) + '\n'
-            logger.debug(f"📤 Sending notification: {notification_json.strip()}")
-            self.process.stdin.write(notification_json.encode())
-            await self.process.stdin.drain()
+            self._log_payload("📤 Sending notification:", initialized_notification)
+            await self._write_message(initialized_notification)
 
         return response
 
     async def list_tools(self):
         """List available tools"""
-        return await self.send_request("tools/list", {})
+        response = await self.send_request("tools/list", {})
+        tools = response.get('result', {}).get('tools', [])
+        self.tools = {tool['name']: tool for tool in tools}
+        return response
 
-    async def call_tool(self, name: str, arguments: dict):
-        """Call a specific tool"""
-        return await self.send_request("tools/call", {
-            "name": name,
-            "arguments": arguments
-        })
+    async def get_tools(self, cache: ToolCatalogCache = None):
+        """Return the tool catalogue, skipping tools/list when cached for this server version"""
+        if cache is not None:
+            tools = cache.load(self.server_info)
+            if tools is not None:
+                self._cache_hits_total.inc(cache="tool_catalog")
+                logger.debug(f"Using cached tool catalogue for {self.server_info.get('version')}")
+                self.tools = {tool['name']: tool for tool in tools}
+                self._tool_cache = cache
+                self._tools_from_cache = True
+                return tools
+            self._cache_misses_total.inc(cache="tool_catalog")
+
+        await self.list_tools()
+        tools = list(self.tools.values())
+        if cache is not None and tools:
+            cache.store(self.server_info, tools)
+        return tools
+
+    def _validate_call(self, name: str, arguments: dict):
+        if name not in self.tools:
+            raise ValueError(f"Unknown MCP tool: {name}")
+        validate_tool_arguments(self.tools[name], arguments)
+
+    async def _refresh_cached_tools(self):
+        """Replace a cached catalogue with a fresh tools/list, once however many callers ask"""
+        if not self._tools_from_cache:
+            return
+        await self._single_flight.do("tools/list", self.list_tools)
+        self._tools_from_cache = False
+        if self._tool_cache is not None and self.tools:
+            self._tool_cache.store(self.server_info, list(self.tools.values()))
+
+    async def call_tool(self, name: str, arguments: dict, timeout: float = None, coalesce: bool = True):
+        """Call a specific tool, validating arguments when the catalogue is known
+
+        Concurrent calls with the same name and arguments share one request
+        (and the same response object) unless coalesce is False. The first
+        caller's timeout applies to everyone joining that request.
+        """
+        if self.tools:
+            try:
+                self._validate_call(name, arguments)
+            except ValueError as e:
+                if not self._tools_from_cache:
+                    raise
+                # The cached catalogue may predate a server upgrade
+                logger.info(f"🔄 Cached tool catalogue rejected the call ({e}) - refetching tools/list")
+                await self._refresh_cached_tools()
+                self._validate_call(name, arguments)
+
+        def request():
+            return self.send_request("tools/call", {
+                "name": name,
+                "arguments": arguments
+            }, timeout=timeout)
+
+        if not coalesce:
+            return await request()
+        return await self._single_flight.do(call_key(name, arguments), request)
 
     async def close(self):
         """Close the MCP server connection"""
         if self.process:
-            self.process.terminate()
+            if self.process.returncode is None:
+                self.process.terminate()
             await self.process.wait()
+        if self._reader_task:
+            await self._reader_task
+            self._reader_task = None
+        if self._stderr_task:
+            await self._stderr_task
+            self._stderr_task = None
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests currently awaiting a response"""
+        return len(self._pending)
+
+    def is_alive(self) -> bool:
+        """Whether the server process and its response reader are still running"""
+        return (
+            self.process is not None
+            and self.process.returncode is None
+            and self._reader_task is not None
+            and not self._reader_task.done()
+        )
+
+class MCPServerPool:
+    """Keeps several initialized MCP OSM server processes warm and balances calls across them"""
+
+    def __init__(self, size: int = 2, health_check_interval: float = 30.0, tool_cache: ToolCatalogCache = None,
+                 client_options: dict = None, metrics: MetricsRegistry = None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.tool_cache = tool_cache
+        # Keyword arguments for each MCPOSMClient (request_timeout, stream_limit, ...)
+        self.client_options = client_options or {}
+        self.health_check_interval = health_check_interval
+        self.tools = []
+        self._clients = [None] * size
+        self._restart_locks = [asyncio.Lock() for _ in range(size)]
+        self._health_task = None
+        self._restart_tasks = {}
+        self._closed = False
+        self.metrics = metrics or metrics_registry
+        self._single_flight = SingleFlight(self.metrics)
+        self._restarts_total = self.metrics.counter("mcp_restarts_total", "Dead MCP server processes replaced")
+
+    async def _start_client(self):
+        """Spawn and fully initialize one MCP server process"""
+        client = MCPOSMClient(metrics=self.metrics, **self.client_options)
+        if not await client.connect_to_server():
+            raise ConnectionError("Failed to start MCP OSM server")
+        try:
+            init_response = await client.initialize()
+            if 'result' not in init_response:
+                raise ConnectionError(f"MCP initialize failed: {init_response.get('error')}")
+            self.tools = await client.get_tools(self.tool_cache)
+        except BaseException:
+            await client.close()
+            raise
+        return client
+
+    async def _restart(self, index: int):
+        """Replace a dead client in the given slot, once even under concurrent callers"""
+        async with self._restart_locks[index]:
+            client = self._clients[index]
+            if client is not None and client.is_alive():
+                return client
+            if client is not None:
+                logger.warning(f"♻️  Restarting dead MCP server in pool slot {index}")
+                self._restarts_total.inc()
+                await client.close()
+            self._clients[index] = await self._start_client()
+            return self._clients[index]
+
+    def _restart_in_background(self, index: int):
+        """Schedule a restart of one slot without making the caller wait for it"""
+        task = self._restart_tasks.get(index)
+        if task is not None and not task.done():
+            return
+
+        async def restart():
+            try:
+                await self._restart(index)
+            except Exception as e:
+                logger.error(f"❌ Failed to restart MCP server in pool slot {index}: {e}")
+
+        self._restart_tasks[index] = asyncio.create_task(restart())
+
+    async def start(self):
+        """Start all pool processes concurrently, terminating them all if any fails"""
+        results = await asyncio.gather(*(self._restart(i) for i in range(self.size)), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await self.close()
+            raise errors[0]
+        self._health_task = asyncio.create_task(self._health_check_loop())
+        logger.info(f"✅ MCP server pool ready with {self.size} processes")
+        return self
+
+    async def _health_check_loop(self):
+        """Periodically restart processes that have exited"""
+        while not self._closed:
+            await asyncio.sleep(self.health_check_interval)
+            for index, client in enumerate(self._clients):
+                if client is None or not client.is_alive():
+                    try:
+                        await self._restart(index)
+                    except Exception as e:
+                        logger.error(f"❌ Failed to restart MCP server in pool slot {index}: {e}")
+
+    async def acquire(self) -> MCPOSMClient:
+        """Return the live client with the fewest outstanding requests"""
+        if self._closed:
+            raise RuntimeError("MCP server pool is closed")
+        alive = []
+        dead = []
+        for index, client in enumerate(self._clients):
+            if client is not None and client.is_alive():
+                alive.append(client)
+            else:
+                dead.append(index)
+        if not alive:
+            return await self._restart(dead[0])
+        for index in dead:
+            self._restart_in_background(index)
+        return min(alive, key=lambda client: client.in_flight)
+
+    async def call_tool(self, name: str, arguments: dict, timeout: float = None, coalesce: bool = True):
+        """Call a tool on the least loaded server process, coalescing identical concurrent calls
+
+        As with MCPOSMClient.call_tool, the first caller's timeout applies to coalesced waiters.
+        """
+        async def request():
+            client = await self.acquire()
+            return await client.call_tool(name, arguments, timeout=timeout, coalesce=False)
+
+        if not coalesce:
+            return await request()
+        return await self._single_flight.do(call_key(name, arguments), request)
+
+    async def close(self):
+        """Stop health checks and terminate all server processes"""
+        self._closed = True
+        tasks = [task for task in [self._health_task, *self._restart_tasks.values()] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._restart_tasks = {}
+        await asyncio.gather(*(client.close() for client in self._clients if client is not None))
+        self._clients = [None] * self.size
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE_LAT = 111320.0
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters between two points"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def place_coordinates(place: dict):
+    """Return (lat, lon) of an OSM place in any of the shapes the server emits, or None"""
+    if place.get('lat') is not None and place.get('lon') is not None:
+        return place['lat'], place['lon']
+    coordinates = place.get('coordinates') or place.get('center') or {}
+    lat = coordinates.get('latitude', coordinates.get('lat'))
+    lon = coordinates.get('longitude', coordinates.get('lon'))
+    if lat is None or lon is None:
+        return None
+    return lat, lon
+
+def nearest_places(places: list, latitude: float, longitude: float, limit: int = None) -> list:
+    """Return the `limit` places closest to a point, nearest first, setting place['distance'] in meters
+
+    With NumPy, distances are computed in one vectorized haversine pass and the
+    top-k is selected with argpartition; otherwise heapq.nsmallest is used.
+    Places without coordinates are kept after the ranked ones with distance None.
+    """
+    located, unlocated = [], []
+    lats, lons = [], []
+    for place in places:
+        coordinates = place_coordinates(place)
+        if coordinates is None:
+            place['distance'] = None
+            unlocated.append(place)
+        else:
+            located.append(place)
+            lats.append(coordinates[0])
+            lons.append(coordinates[1])
+    if limit is None:
+        limit = len(places)
+
+    k = min(limit, len(located))
+    if k == 0:
+        ranked = []
+    elif np is not None:
+        phi1 = math.radians(latitude)
+        phi2 = np.radians(np.asarray(lats, dtype=np.float64))
+        dlambda = np.radians(np.asarray(lons, dtype=np.float64) - longitude)
+        a = np.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+        distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+        if k < len(located):
+            nearest = np.argpartition(distances, k - 1)[:k]
+            order = nearest[np.argsort(distances[nearest], kind='stable')]
+        else:
+            order = np.argsort(distances, kind='stable')
+        ranked = []
+        for i in order.tolist():
+            located[i]['distance'] = float(distances[i])
+            ranked.append(located[i])
+    else:
+        distances = [haversine_m(latitude, longitude, lat, lon) for lat, lon in zip(lats, lons)]
+        ranked = []
+        for i in heapq.nsmallest(k, range(len(located)), key=distances.__getitem__):
+            located[i]['distance'] = distances[i]
+            ranked.append(located[i])
+
+    return ranked + unlocated[:max(0, limit - len(ranked))]
+
+def parse_tool_text(response: dict):
+    """Decode the JSON text payload of a tools/call response, or None if there is none"""
+    content = response.get('result', {}).get('content') if 'result' in response else None
+    if not content:
+        return None
+    return json_codec.loads(content[0]['text'])
+
+class NearbyPlacesTileCache:
+    """TTL/LRU cache of find_nearby_places results stored per lat/lon grid tile
+
+    Each tile is fetched once (centered on the tile, with a radius covering it)
+    and keeps only the places inside its bounds, so any query is answered by
+    unioning the covering tiles and filtering by distance.
+    """
+
+    def __init__(self, tile_size_deg: float = 0.005, ttl: float = 24 * 3600, max_tiles: int = 2048,
+                 max_tiles_per_query: int = 36, tile_fetch_limit: int = 500, metrics: MetricsRegistry = None):
+        self.tile_size_deg = tile_size_deg
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self.max_tiles_per_query = max_tiles_per_query
+        self.tile_fetch_limit = tile_fetch_limit
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+        metrics = metrics or metrics_registry
+        self._cache_hits_total = metrics.counter("cache_hits_total", "Cache lookups answered", ("cache",))
+        self._cache_misses_total = metrics.counter("cache_misses_total", "Cache lookups missed", ("cache",))
+
+    def _covering_tiles(self, latitude: float, longitude: float, radius: float):
+        dlat = radius / METERS_PER_DEGREE_LAT
+        dlon = radius / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+        size = self.tile_size_deg
+        rows = range(math.floor((latitude - dlat) / size), math.floor((latitude + dlat) / size) + 1)
+        cols = range(math.floor((longitude - dlon) / size), math.floor((longitude + dlon) / size) + 1)
+        return [(row, col) for row in rows for col in cols]
+
+    def _get(self, key):
+        entry = self._tiles.get(key)
+        if entry is None:
+            return None
+        expires_at, places = entry
+        if expires_at < time.monotonic():
+            del self._tiles[key]
+            return None
+        self._tiles.move_to_end(key)
+        return places
+
+    def _put(self, key, places):
+        self._tiles[key] = (time.monotonic() + self.ttl, places)
+        self._tiles.move_to_end(key)
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+
+    async def _fetch_tiles(self, client, tiles: list, categories: list, timeout: float = None):
+        """Fetch the given tiles with one upstream call covering their bounding box
+
+        Returns ({tile: [(category, subcategory, place, lat, lon), ...]}, complete);
+        complete is False when the call hit tile_fetch_limit, so the tiles may
+        be missing places and must be neither cached nor used to answer a query.
+        """
+        size = self.tile_size_deg
+        south = min(row for row, col in tiles) * size
+        north = (max(row for row, col in tiles) + 1) * size
+        west = min(col for row, col in tiles) * size
+        east = (max(col for row, col in tiles) + 1) * size
+        center_lat, center_lon = (south + north) / 2, (west + east) / 2
+        radius = max(haversine_m(center_lat, center_lon, lat, lon)
+                     for lat in (south, north) for lon in (west, east))
+
+        places_data = await call_find_nearby_places(client, center_lat, center_lon, math.ceil(radius),
+                                                    categories, self.tile_fetch_limit, timeout) or {}
+        fetched = {tile: [] for tile in tiles}
+        returned = 0
+        for category, subcategories in places_data.get('categories', {}).items():
+            for subcategory, entries in subcategories.items():
+                returned += len(entries)
+                for place in entries:
+                    coordinates = place_coordinates(place)
+                    if coordinates is None:
+                        continue
+                    lat, lon = coordinates
+                    tile = (math.floor(lat / size), math.floor(lon / size))
+                    if tile in fetched:
+                        fetched[tile].append((category, subcategory, place, lat, lon))
+        complete = returned < self.tile_fetch_limit
+        if not complete:
+            logger.warning(f"⚠️  Tile fetch hit tile_fetch_limit ({self.tile_fetch_limit}); "
+                           f"not caching {len(tiles)} tiles")
+        return fetched, complete
+
+    async def find_nearby_places(self, client, latitude: float, longitude: float, radius: float,
+                                 categories: list, limit: int, timeout: float = None):
+        """Answer a find_nearby_places query from cached tiles, fetching missing ones in one call"""
+        tiles = self._covering_tiles(latitude, longitude, radius)
+        if len(tiles) > self.max_tiles_per_query:
+            # Too large to tile efficiently; go straight to the server
+            return await call_find_nearby_places(client, latitude, longitude, radius, categories, limit, timeout)
+
+        category_key = tuple(sorted(categories))
+        cached = {}
+        missing = []
+        for tile in tiles:
+            places = self._get((category_key, tile))
+            if places is None:
+                missing.append(tile)
+            else:
+                cached[tile] = places
+        self.hits += len(cached)
+        self.misses += len(missing)
+        self._cache_hits_total.inc(len(cached), cache="tiles")
+        self._cache_misses_total.inc(len(missing), cache="tiles")
+
+        if missing:
+            fetched, complete = await self._fetch_tiles(client, missing, categories, timeout)
+            if not complete:
+                # The truncated fetch was centred on the missing tiles, not on the
+                # query point, so it may lack the nearest places; ask directly
+                return await call_find_nearby_places(client, latitude, longitude, radius, categories, limit,
+                                                     timeout)
+            for tile, places in fetched.items():
+                self._put((category_key, tile), places)
+                cached[tile] = places
+
+        candidates = []
+        for places in cached.values():
+            for category, subcategory, place, lat, lon in places:
+                distance = haversine_m(latitude, longitude, lat, lon)
+                if distance <= radius:
+                    candidates.append((distance, category, subcategory, place))
+        candidates.sort(key=lambda candidate: candidate[0])
+
+        result = {}
+        for distance, category, subcategory, place in candidates[:limit]:
+            result.setdefault(category, {}).setdefault(subcategory, []).append(place)
+        return {
+            "query": {
+                "latitude": latitude,
+                "longitude": longitude,
+                "radius": radius
+            },
+            "categories": result,
+            "total_count": min(len(candidates), limit)
+        }
+
+async def call_find_nearby_places(client, latitude: float, longitude: float, radius: float,
+                                  categories: list, limit: int, timeout: float = None):
+    """Call the find_nearby_places tool and decode its payload, raising on an error response"""
+    response = await client.call_tool("find_nearby_places", {
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius": radius,
+        "categories": categories,
+        "limit": limit
+    }, timeout=timeout)
+    if 'error' in response:
+        raise RuntimeError(f"find_nearby_places failed: {response['error']}")
+    return parse_tool_text(response)
+
+async def find_nearby_places(client, latitude: float, longitude: float, radius: float,
+                             categories: list, limit: int, cache: NearbyPlacesTileCache = None,
+                             timeout: float = None):
+    """Run a find_nearby_places lookup, through the tile cache when one is given"""
+    if cache is not None:
+        return await cache.find_nearby_places(client, latitude, longitude, radius, categories, limit, timeout)
+    return await call_find_nearby_places(client, latitude, longitude, radius, categories, limit, timeout)
+
+RESTAURANT_AMENITIES = ('restaurant', 'cafe', 'fast_food', 'bar', 'pub')
+
+class OfflinePlaceIndex:
+    """Static KD-tree over OSM restaurant amenities, served without the MCP server
+
+    Points are stored in KD-sorted order (median splits alternating lat/lon,
+    leaves of node_size points) so the tree is implicit in the arrays and the
+    whole index is a single JSON file.
+    """
+
+    FORMAT = "tabletalk-place-index"
+    VERSION = 1
+
+    def __init__(self, lats: list, lons: list, places: list, node_size: int = 64):
+        self.lats = lats
+        self.lons = lons
+        self.places = places
+        self.node_size = node_size
+
+    @classmethod
+    def build(cls, places: list, node_size: int = 64):
+        """Build an index from place dicts carrying lat/lon"""
+        items = [(place['lat'], place['lon'], place) for place in places]
+
+        def sort_kd(lo: int, hi: int, axis: int):
+            if hi - lo <= node_size:
+                return
+            items[lo:hi + 1] = sorted(items[lo:hi + 1], key=lambda item: item[axis])
+            mid = (lo + hi) >> 1
+            sort_kd(lo, mid - 1, 1 - axis)
+            sort_kd(mid + 1, hi, 1 - axis)
+
+        sort_kd(0, len(items) - 1, 0)
+        return cls([item[0] for item in items], [item[1] for item in items],
+                   [item[2] for item in items], node_size)
+
+    @classmethod
+    def from_source(cls, path, node_size: int = 64):
+        """Build an index from an Overpass JSON dump or, if pyosmium is installed, an OSM PBF/XML extract"""
+        path = Path(path)
+        if path.suffix in ('.pbf', '.osm'):
+            places = _read_pbf_places(path)
+        else:
+            with open(path, 'r') as f:
+                places = _overpass_places(json.load(f))
+        logger.info(f"🗂️  Indexed {len(places)} places from {path}")
+        return cls.build(places, node_size)
+
+    def save(self, path):
+        """Write the index to disk"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({
+                "format": self.FORMAT,
+                "version": self.VERSION,
+                "node_size": self.node_size,
+                "lat": self.lats,
+                "lon": self.lons,
+                "places": self.places
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if data.get("format") != cls.FORMAT or data.get("version") != cls.VERSION:
+            raise ValueError(f"{path} is not a version {cls.VERSION} place index")
+        return cls(data["lat"], data["lon"], data["places"], data["node_size"])
+
+    def _range(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float):
+        """Yield indices of points inside the bounding box"""
+        if not self.places:
+            return
+        lats, lons, node_size = self.lats, self.lons, self.node_size
+        stack = [(0, len(self.places) - 1, 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= node_size:
+                for i in range(lo, hi + 1):
+                    if min_lat <= lats[i] <= max_lat and min_lon <= lons[i] <= max_lon:
+                        yield i
+                continue
+
+            mid = (lo + hi) >> 1
+            lat, lon = lats[mid], lons[mid]
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+                yield mid
+            value, low, high = (lat, min_lat, max_lat) if axis == 0 else (lon, min_lon, max_lon)
+            if low <= value:
+                stack.append((lo, mid - 1, 1 - axis))
+            if high >= value:
+                stack.append((mid + 1, hi, 1 - axis))
+
+    def find_nearby_places(self, latitude: float, longitude: float, radius: float,
+                           categories: list = ("amenity",), limit: int = 10):
+        """Return the same result shape as the find_nearby_places MCP tool"""
+        candidates = []
+        if "amenity" in categories:
+            dlat = radius / METERS_PER_DEGREE_LAT
+            dlon = radius / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+            for i in self._range(latitude - dlat, longitude - dlon, latitude + dlat, longitude + dlon):
+                distance = haversine_m(latitude, longitude, self.lats[i], self.lons[i])
+                if distance <= radius:
+                    candidates.append((distance, i))
+        candidates.sort()
+
+        amenities = {}
+        for distance, i in candidates[:limit]:
+            place = self.places[i]
+            amenities.setdefault(place['tags']['amenity'], []).append(place)
+        return {
+            "query": {
+                "latitude": latitude,
+                "longitude": longitude,
+                "radius": radius
+            },
+            "categories": {"amenity": amenities} if amenities else {},
+            "total_count": min(len(candidates), limit)
+        }
+
+def _overpass_places(dump: dict) -> list:
+    """Extract restaurant amenities from an Overpass JSON dump (out center for ways/relations)"""
+    places = []
+    for element in dump.get('elements', []):
+        tags = element.get('tags') or {}
+        if tags.get('amenity') not in RESTAURANT_AMENITIES:
+            continue
+        coordinates = place_coordinates(element)
+        if coordinates is None:
+            continue
+        places.append({
+            "id": element.get('id'),
+            "type": element.get('type', 'node'),
+            "name": tags.get('name', 'Unnamed'),
+            "lat": coordinates[0],
+            "lon": coordinates[1],
+            "tags": tags
+        })
+    return places
+
+def _read_pbf_places(path: Path) -> list:
+    """Extract restaurant amenities from an OSM PBF (or OSM XML) extract using pyosmium
+
+    Nodes use their location, ways the mean of their node locations and
+    multipolygon relations the mean of their outer rings.
+    """
+    try:
+        import osmium
+    except ImportError:
+        raise RuntimeError("Reading .pbf extracts requires pyosmium (pip install osmium)")
+
+    places = []
+
+    def add(kind, osm_id, tags, locations):
+        tags = {tag.k: tag.v for tag in tags}
+        if tags.get('amenity') not in RESTAURANT_AMENITIES or not locations:
+            return
+        places.append({
+            "id": osm_id,
+            "type": kind,
+            "name": tags.get('name', 'Unnamed'),
+            "lat": sum(location.lat for location in locations) / len(locations),
+            "lon": sum(location.lon for location in locations) / len(locations),
+            "tags": tags
+        })
+
+    class AmenityHandler(osmium.SimpleHandler):
+        def node(self, n):
+            if 'amenity' in n.tags:
+                add('node', n.id, n.tags, [n.location])
+
+        def way(self, w):
+            if 'amenity' in w.tags:
+                add('way', w.id, w.tags, [node.location for node in w.nodes if node.location.valid()])
+
+        def area(self, a):
+            # Ways are handled above; areas add multipolygon relations
+            if a.from_way() or 'amenity' not in a.tags:
+                return
+            locations = [node.location for ring in a.outer_rings() for node in ring if node.location.valid()]
+            add('relation', a.orig_id(), a.tags, locations)
+
+    AmenityHandler().apply_file(str(path), locations=True)
+    return places
+
+class MistralAPIError(Exception):
+    """Non-successful response from the Mistral API"""
+
+    def __init__(self, status_code: int, payload):
+        super().__init__(f"Mistral API returned {status_code}: {payload}")
+        self.status_code = status_code
+        self.payload = payload
+
+class TokenBucket:
+    """Async token-bucket rate limiter that can also be paused (e.g. by Retry-After)"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        """Hold back every caller for at least the given time"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+def parse_retry_after(value: str):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        pass
+    else:
+        return max(0.0, seconds) if math.isfinite(seconds) else None
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class CompletionCache:
+    """Content-addressed cache of chat completions: in-memory LRU plus optional SQLite tier"""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, path=None, max_disk_entries: int = 10000,
+                 prune_interval: int = 100, metrics: MetricsRegistry = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.prune_interval = prune_interval
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        metrics = metrics or metrics_registry
+        self._cache_hits_total = metrics.counter("cache_hits_total", "Cache lookups answered", ("cache",))
+        self._cache_misses_total = metrics.counter("cache_misses_total", "Cache lookups missed", ("cache",))
+        self._memory = OrderedDict()
+        self._db = None
+        self._executor = None
+        self._puts_since_prune = 0
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            # All SQLite work runs on one dedicated thread, so statements and
+            # commits from concurrent coroutines never interleave
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="completion-cache")
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS completions_accessed_at ON completions (accessed_at)")
+            self._db.commit()
+
+    async def _run_disk(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    def make_key(model: str, messages: list, params: dict) -> str:
+        """Hash of model, normalized messages and sampling parameters"""
+        normalized = [
+            {**message, "content": message.get("content", "").strip()}
+            if isinstance(message.get("content"), str) else message
+            for message in messages
+        ]
+        canonical = json.dumps({"model": model, "messages": normalized, "params": params},
+                               sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _disk_get(self, key: str):
+        row = self._db.execute("SELECT response, expires_at FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, expires_at = row
+        if expires_at < time.time():
+            self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        self._db.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self._db.commit()
+        return json.loads(response)
+
+    def _disk_put(self, key: str, response: dict):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO completions (key, response, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(response), now + self.ttl, now)
+        )
+        self._puts_since_prune += 1
+        if self._puts_since_prune >= self.prune_interval:
+            self._puts_since_prune = 0
+            self._prune(now)
+        self._db.commit()
+
+    def _prune(self, now: float):
+        """Drop expired rows and keep only the max_disk_entries most recently used"""
+        self._db.execute("DELETE FROM completions WHERE expires_at < ?", (now,))
+        self._db.execute(
+            "DELETE FROM completions WHERE accessed_at < "
+            "(SELECT accessed_at FROM completions ORDER BY accessed_at DESC LIMIT 1 OFFSET ?)",
+            (self.max_disk_entries - 1,)
+        )
+
+    def _memory_put(self, key: str, response: dict):
+        self._memory[key] = (time.monotonic() + self.ttl, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str):
+        """Return a cached response (shared, do not mutate) or None"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, response = entry
+            if expires_at >= time.monotonic():
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self._cache_hits_total.inc(cache="completions")
+                return response
+            del self._memory[key]
+
+        if self._db is not None:
+            response = await self._run_disk(self._disk_get, key)
+            if response is not None:
+                self._memory_put(key, response)
+                self.hits += 1
+                self.disk_hits += 1
+                self._cache_hits_total.inc(cache="completions_disk")
+                return response
+
+        self.misses += 1
+        self._cache_misses_total.inc(cache="completions")
+        return None
+
+    async def put(self, key: str, response: dict):
+        """Store a response in every tier"""
+        self._memory_put(key, response)
+        if self._db is not None:
+            await self._run_disk(self._disk_put, key, response)
+
+    def close(self):
+        """Close the SQLite tier"""
+        if self._db is not None:
+            self._executor.shutdown(wait=True)
+            self._db.close()
+            self._db = None
+            self._executor = None
 
 class MistralClient:
-    def __init__(self, env_vars):
+    RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(self, env_vars, http2: bool = True, max_connections: int = 20,
+                 max_keepalive_connections: int = 10, timeout: float = 30.0,
+                 max_retries: int = 4, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 max_concurrency: int = 8, cache: CompletionCache = None, max_retry_after: float = 60.0,
+                 metrics: MetricsRegistry = None):
         self.api_key = env_vars.get("MISTRAL_API_KEY")
         if not self.api_key:
             logger.warning("⚠️  MISTRAL_API_KEY not found in .env file - skipping Mistral integration")
             self.api_key = None
 
         self.base_url = "https://api.mistral.ai/v1"
+        # httpx needs the optional h2 package for HTTP/2
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            logger.debug("h2 not installed - Mistral client falls back to HTTP/1.1")
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections)
+        self.timeout = timeout
+        self._client = None
+        self._warm_up_task = None
+
+        # Client-side limits sized to the account quota (requests per second)
+        requests_per_second = float(env_vars.get("MISTRAL_REQUESTS_PER_SECOND", 1.0))
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache = cache
+        self.metrics = metrics or metrics_registry
+        self._requests_total = self.metrics.counter(
+            "mistral_requests_total", "Mistral HTTP attempts by status code", ("status",))
+        self._retries_total = self.metrics.counter("mistral_retries_total", "Mistral requests retried")
+        self._tokens_total = self.metrics.counter("mistral_tokens_total", "Mistral tokens consumed", ("kind",))
 
-    async def chat_completion(self, messages: list):
-        """Send chat completion request to Mistral"""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Long-lived HTTP client, created on first use so unused instances cost nothing"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
                 headers={
                     "Authorization": f"Bearer {self.api_key}",
                     "Content-Type": "application/json"
                 },
-                json={
-                    "model": "mistral-small-latest",
-                    "messages": messages
-                }
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout
             )
-            return response.json()
+        return self._client
 
-async def main():
-    """Main function demonstrating MCP OSM + Mistral integration"""
+    def start_warm_up(self):
+        """Open the pooled connection (DNS, TCP, TLS) in the background before the first completion"""
+        if self.api_key and self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self._warm_up())
+        return self._warm_up_task
 
-    # Initialize clients
-    osm_client = MCPOSMClient()
-    mistral_client = MistralClient(env_vars)
+    async def _warm_up(self):
+        try:
+            await self.client.get("/models", timeout=5.0)
+        except httpx.HTTPError as e:
+            logger.debug(f"Mistral warm-up failed: {e!r}")
 
-    try:
-        # Connect to MCP server
-        if not await osm_client.connect_to_server():
-            return
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._warm_up_task is not None:
+            self._warm_up_task.cancel()
+            await asyncio.gather(self._warm_up_task, return_exceptions=True)
+            self._warm_up_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
 
-        # Initialize MCP connection
-        logger.info("🔌 Initializing MCP connection...")
-        init_response = await osm_client.initialize()
-        logger.debug(f"Initialization: {init_response}")
+    async def __aenter__(self):
+        return self
 
-        # List available tools
-        logger.info("🛠️  Listing available tools...")
-        tools_response = await osm_client.list_tools()
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
 
-        available_tools = tools_response.get('result', {}).get('tools', [])
-        logger.info(f"Available tools ({len(available_tools)}):")
-        for tool in available_tools:
-            logger.info(f"  - {tool['name']}: {tool.get('description', 'No description')}")
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for the given retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
 
-        if not available_tools:
-            logger.error("❌ No tools available - something might be wrong with the MCP server")
-            return
+    async def _post(self, path: str, payload: dict, stream: bool = False) -> httpx.Response:
+        """POST with rate limiting, bounded concurrency and retries of transient failures
 
-        # Use hardcoded coordinates: 52°21'40.8"N 4°55'05.1"E
-        lat = 52.3613333  # 52°21'40.8"N
-        lon = 4.9180833   # 4°55'05.1"E
-        logger.info(f"📍 Using coordinates: {lat}, {lon}")
+        With stream=True the response body is left unread for the caller, who
+        must hold the concurrency semaphore and close the response.
+        """
+        if self._warm_up_task is not None and not self._warm_up_task.done():
+            # Reuse the connection being opened rather than racing a second handshake
+            await asyncio.shield(self._warm_up_task)
+
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire()
+            try:
+                if stream:
+                    request = self.client.build_request("POST", path, json=payload)
+                    response = await self.client.send(request, stream=True)
+                else:
+                    async with self._semaphore:
+                        response = await self.client.post(path, json=payload)
+            except httpx.TransportError as e:
+                self._requests_total.inc(status="transport_error")
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(f"⚠️  Mistral request failed ({e!r}), retrying in {delay:.2f}s")
+            else:
+                self._requests_total.inc(status=response.status_code)
+                if response.status_code < 400:
+                    return response
+                if stream:
+                    await response.aread()
+                    await response.aclose()
+                if response.status_code not in self.RETRYABLE_STATUS or attempt >= self.max_retries:
+                    try:
+                        payload_error = response.json()
+                    except ValueError:
+                        payload_error = response.text
+                    raise MistralAPIError(response.status_code, payload_error)
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                if retry_after is not None:
+                    # A huge Retry-After must not stall every caller indefinitely
+                    retry_after = min(retry_after, self.max_retry_after)
+                    self.rate_limiter.pause(retry_after)
+                    delay = retry_after
+                else:
+                    delay = self._backoff(attempt)
+                logger.warning(f"⚠️  Mistral returned {response.status_code}, retrying in {delay:.2f}s")
+            self._retries_total.inc()
+            attempt += 1
+            await asyncio.sleep(delay)
 
-        # Find nearby restaurants
-        logger.info("🍽️  Finding nearby restaurants...")
-        restaurants_response = await osm_client.call_tool(
-            "find_nearby_places",
+    async def chat_completion(self, messages: list, model: str = "mistral-small-latest",
+                              use_cache: bool = True, **params):
+        """Send chat completion request to Mistral
+
+        Extra keyword arguments (temperature, max_tokens, ...) are passed through.
+        Responses are served from the cache when one is configured; pass
+        use_cache=False for non-deterministic sampling.
+        """
+        key = None
+        if self.cache is not None and use_cache:
+            key = CompletionCache.make_key(model, messages, params)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        response = await self._post(
+            "/chat/completions",
             {
-                "latitude": lat,
-                "longitude": lon,
-                "radius": 500,
-                "categories": ["amenity"],
-                "limit": 10
+                "model": model,
+                "messages": messages,
+                **params
             }
         )
+        completion = response.json()
+        self.record_usage(completion.get('usage'))
+        if key is not None:
+            await self.cache.put(key, completion)
+        return completion
+
+    def record_usage(self, usage: dict):
+        """Count prompt and completion tokens from a response's usage block"""
+        for kind in ('prompt', 'completion'):
+            tokens = (usage or {}).get(f"{kind}_tokens")
+            if tokens:
+                self._tokens_total.inc(tokens, kind=kind)
+
+    @contextlib.asynccontextmanager
+    async def chat_completion_stream(self, messages: list, model: str = "mistral-small-latest", **params):
+        """Stream a chat completion as an async iterator of content deltas (SSE)
+
+        Use as `async with client.chat_completion_stream(messages) as deltas:`;
+        leaving the block releases the connection and the concurrency slot even
+        if the consumer stops iterating early.
+        """
+        async with self._semaphore:
+            response = await self._post(
+                "/chat/completions",
+                {
+                    "model": model,
+                    "messages": messages,
+                    **params,
+                    "stream": True
+                },
+                stream=True
+            )
+            try:
+                yield _sse_deltas(response, self.record_usage)
+            finally:
+                await response.aclose()
+
+async def _sse_deltas(response: httpx.Response, on_usage=None):
+    """Parse chat completion SSE events from a streaming response into content deltas
+
+    on_usage, if given, is called with the usage block the final event carries.
+    """
+    data_lines = []
+
+    def deltas(data: str):
+        event = json.loads(data)
+        if on_usage is not None and event.get("usage"):
+            on_usage(event["usage"])
+        for choice in event.get("choices", []):
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            data_lines.append(line[5:].lstrip())
+            continue
+        if line or not data_lines:
+            # Comments, other SSE fields, or keep-alive blank lines
+            continue
+
+        data, data_lines = "\n".join(data_lines), []
+        if data == "[DONE]":
+            return
+        for content in deltas(data):
+            yield content
+
+    # The stream may end without the blank line that terminates the last event
+    data = "\n".join(data_lines)
+    if data and data != "[DONE]":
+        for content in deltas(data):
+            yield content
+
+async def collect_stream(deltas) -> dict:
+    """Accumulate streamed content deltas into a final assistant message"""
+    parts = []
+    async for delta in deltas:
+        parts.append(delta)
+    return {"role": "assistant", "content": "".join(parts)}
+
+# Same defaults and mappings as the frontend (userProfileService / osmService)
+DEFAULT_USER_PROFILE = {
+    "name": "Demo",
+    "surname": "User",
+    "cuisinePreferences": ["Italian", "Dutch", "French"],
+    "priceRangePreference": "€€",
+    "dietaryRestrictions": ["vegetarian"],
+    "ambiancePreference": "casual"
+}
+
+CUISINE_TYPES = {
+    'italian': 'Italian', 'french': 'French', 'chinese': 'Chinese', 'japanese': 'Japanese',
+    'indian': 'Indian', 'thai': 'Thai', 'mexican': 'Mexican', 'american': 'American',
+    'mediterranean': 'Mediterranean', 'greek': 'Greek', 'turkish': 'Turkish',
+    'vietnamese': 'Vietnamese', 'korean': 'Korean', 'spanish': 'Spanish', 'german': 'German',
+    'dutch': 'Dutch', 'international': 'International', 'regional': 'Regional'
+}
+
+AMENITY_CUISINE_TYPES = {
+    'restaurant': 'International', 'cafe': 'Cafe', 'fast_food': 'Fast Food', 'bar': 'Bar', 'pub': 'Pub'
+}
+
+DIET_TAGS = {
+    'diet:vegetarian': 'vegetarian', 'diet:vegan': 'vegan', 'diet:gluten_free': 'gluten-free',
+    'diet:halal': 'halal', 'diet:kosher': 'kosher'
+}
+
+# OSM has no ratings; a fixed neutral value keeps the local ranking deterministic
+DEFAULT_RATING = 4.0
+
+def restaurant_features(place: dict) -> dict:
+    """Derive cuisine, price range, ambiance, dietary options and rating from OSM tags"""
+    tags = place.get('tags', {})
+    amenity = tags.get('amenity')
+
+    cuisine = (tags.get('cuisine') or '').split(';')[0].strip().lower()
+    cuisine_type = CUISINE_TYPES.get(cuisine) or AMENITY_CUISINE_TYPES.get(amenity, 'Restaurant')
+
+    price_tag = (tags.get('price:range') or '').lower()
+    if 'expensive' in price_tag or 'high' in price_tag:
+        price_range = '€€€'
+    elif 'moderate' in price_tag or 'medium' in price_tag:
+        price_range = '€€'
+    elif 'cheap' in price_tag or 'low' in price_tag:
+        price_range = '€'
+    else:
+        price_range = '€' if amenity in ('fast_food', 'cafe') else '€€'
+
+    if tags.get('atmosphere'):
+        ambiance_type = tags['atmosphere']
+    elif amenity == 'restaurant' and (cuisine == 'french' or tags.get('restaurant:type') == 'fine_dining'):
+        ambiance_type = 'fine dining'
+    elif amenity == 'restaurant' and tags.get('outdoor_seating') == 'yes':
+        ambiance_type = 'romantic'
+    else:
+        ambiance_type = 'casual'
+
+    dietary_options = [option for tag, option in DIET_TAGS.items() if tags.get(tag) in ('yes', 'only')]
+    if not dietary_options:
+        dietary_options = ['vegetarian']
+
+    try:
+        rating = float(tags.get('stars') or tags.get('rating') or DEFAULT_RATING)
+    except ValueError:
+        rating = DEFAULT_RATING
+
+    return {
+        "cuisineType": cuisine_type,
+        "priceRange": price_range,
+        "ambianceType": ambiance_type,
+        "dietaryOptions": dietary_options,
+        "rating": rating
+    }
+
+def local_scores(places: list, profile: dict) -> list:
+    """Weighted preference score per place, as in the frontend's calculateRestaurantScore
+
+    cuisine 40, price 25 (15 for one step cheaper), ambiance 20, dietary 10
+    (share of restrictions met), plus rating, minus 2 per km of distance.
+    """
+    cuisines = set(profile.get('cuisinePreferences', []))
+    price_preference = profile.get('priceRangePreference')
+    partial_price = {'€€': '€', '€€€': '€€'}.get(price_preference)
+    ambiance = profile.get('ambiancePreference')
+    restrictions = profile.get('dietaryRestrictions', [])
+
+    features = [restaurant_features(place) for place in places]
+    cuisine_match = [feature['cuisineType'] in cuisines for feature in features]
+    price_points = [
+        25 if feature['priceRange'] == price_preference else 15 if feature['priceRange'] == partial_price else 0
+        for feature in features
+    ]
+    ambiance_match = [feature['ambianceType'] == ambiance for feature in features]
+    dietary_share = [
+        sum(restriction in feature['dietaryOptions'] for restriction in restrictions) / len(restrictions)
+        if restrictions else 0.0
+        for feature in features
+    ]
+    ratings = [feature['rating'] for feature in features]
+    distances_km = [(place.get('distance') or 0) / 1000 for place in places]
+
+    if np is not None and places:
+        scores = (40 * np.asarray(cuisine_match, dtype=np.float64)
+                  + np.asarray(price_points, dtype=np.float64)
+                  + 20 * np.asarray(ambiance_match, dtype=np.float64)
+                  + 10 * np.asarray(dietary_share)
+                  + np.asarray(ratings)
+                  - 2 * np.asarray(distances_km))
+        return np.maximum(scores, 0).tolist()
+    return [
+        max(0.0, 40 * c + p + 20 * a + 10 * d + r - 2 * km)
+        for c, p, a, d, r, km in zip(cuisine_match, price_points, ambiance_match, dietary_share, ratings, distances_km)
+    ]
+
+def rank_locally(places: list, profile: dict) -> list:
+    """Order places by local score (stable, so ties keep their distance order), setting place['score']"""
+    scores = local_scores(places, profile)
+    for place, score in zip(places, scores):
+        place['score'] = round(score, 2)
+    return sorted(places, key=lambda place: -place['score'])
+
+def _place_id(place: dict) -> str:
+    """Identifier for the LLM prompt; OSM ids are only unique per element type (node/way/relation)"""
+    place_id = place.get('id', place.get('name'))
+    return f"{place['type']}/{place_id}" if place.get('type') else str(place_id)
+
+async def rank_restaurants(mistral_client, places: list, profile: dict = None, top_k: int = 6,
+                           prefilter: int = 20, llm_timeout: float = 8.0) -> dict:
+    """Rank restaurants for a profile: local pre-filter, then Mistral, falling back to the local order
+
+    The local ranking trims candidates to `prefilter` before the prompt and is
+    returned as-is when Mistral has no key, errors, or misses llm_timeout.
+    """
+    profile = profile or DEFAULT_USER_PROFILE
+    ranked = rank_locally(places, profile)
+    candidates = ranked[:prefilter]
+    local_result = {
+        "source": "local",
+        "reasoning": "Ranked by cuisine, price, ambiance, dietary match, rating and distance.",
+        "rankedRestaurants": ranked[:top_k]
+    }
+    if not candidates or mistral_client is None or not mistral_client.api_key:
+        return local_result
+
+    summary = [
+        {"id": _place_id(place), "name": place.get('name'), "distance_m": round(place.get('distance') or 0),
+         "localScore": place['score'], **restaurant_features(place)}
+        for place in candidates
+    ]
+    messages = [
+        {"role": "system", "content": (
+            "You rank restaurants for a diner. Reply with JSON only: "
+            '{"ranking": [restaurant ids, best first], "reasoning": "one short paragraph"}'
+        )},
+        {"role": "user", "content": json.dumps({"profile": profile, "restaurants": summary}, ensure_ascii=False)}
+    ]
+    try:
+        completion = await asyncio.wait_for(
+            mistral_client.chat_completion(messages, temperature=0, response_format={"type": "json_object"}),
+            llm_timeout
+        )
+        answer = json.loads(completion['choices'][0]['message']['content'])
+        by_id = {_place_id(place): place for place in candidates}
+        ordered = [by_id.pop(str(place_id)) for place_id in answer.get('ranking', []) if str(place_id) in by_id]
+        ordered.extend(place for place in candidates if _place_id(place) in by_id)
+    except Exception as e:
+        logger.warning(f"⚠️  LLM ranking unavailable ({e!r}) - using local ranking")
+        return local_result
+
+    logger.info(f"🧠 LLM reasoning: {answer.get('reasoning', '')}")
+    return {
+        "source": "llm",
+        "reasoning": answer.get('reasoning', ''),
+        "rankedRestaurants": ordered[:top_k]
+    }
+
+def extract_restaurants(places_data: dict) -> list:
+    """Pick restaurant-like amenities out of a find_nearby_places result, adding phone and website"""
+    # Filter for restaurants specifically
+    restaurants = []
+    if 'amenity' in places_data.get('categories', {}):
+        for subcategory, places in places_data['categories']['amenity'].items():
+            if subcategory in RESTAURANT_AMENITIES:
+                restaurants.extend(places)
+
+    # Enhance restaurants with phone and website info
+    enhanced_restaurants = []
+    for restaurant in restaurants:
+        # Extract phone and website from tags
+        tags = restaurant.get('tags', {})
+        phone = tags.get('phone') or tags.get('contact:phone')
+        website = tags.get('website') or tags.get('contact:website')
+
+        # Add phone and website to restaurant data
+        enhanced_restaurant = restaurant.copy()
+        enhanced_restaurant['phone'] = phone
+        enhanced_restaurant['website'] = website
+        enhanced_restaurants.append(enhanced_restaurant)
+    return enhanced_restaurants
+
+async def recommend_restaurants(mistral_client, places_data: dict, lat: float, lon: float, limit: int,
+                                user_profile: dict = None) -> dict:
+    """Turn a find_nearby_places result into the ranked recommendation result"""
+    enhanced_restaurants = extract_restaurants(places_data) if places_data else []
+    enhanced_restaurants = nearest_places(enhanced_restaurants, lat, lon, limit)
+
+    logger.info("🧠 Ranking restaurants...")
+    ranking = await rank_restaurants(mistral_client, enhanced_restaurants, user_profile,
+                                     top_k=len(enhanced_restaurants))
+    return {
+        "status": "success",
+        "location": {
+            "latitude": lat,
+            "longitude": lon
+        },
+        "restaurants_found": len(enhanced_restaurants),
+        "ranking_source": ranking["source"],
+        "reasoning": ranking["reasoning"],
+        "restaurants": ranking["rankedRestaurants"]
+    }
+
+def read_batch_points(path: str):
+    """Yield coordinate records from a CSV (with a header) or NDJSON file; '-' reads NDJSON from stdin
 
-        if 'result' in restaurants_response and restaurants_response['result']['content']:
-            places_data = json.loads(restaurants_response['result']['content'][0]['text'])
+    Each record has latitude and longitude (lat/lon also accepted) and may
+    carry id, radius and limit overrides. Malformed lines become records with
+    an "error" so one bad row does not abort the batch.
+    """
+    def record(row: dict, line_number: int):
+        try:
+            return parse(row, line_number)
+        except (ValueError, TypeError, AttributeError) as e:
+            return {"id": line_number, "error": f"{path}:{line_number}: {e}"}
 
-            # Filter for restaurants specifically
-            restaurants = []
-            if 'amenity' in places_data.get('categories', {}):
-                for subcategory, places in places_data['categories']['amenity'].items():
-                    if subcategory in ['restaurant', 'cafe', 'fast_food', 'bar', 'pub']:
-                        restaurants.extend(places)
+    def parse(row: dict, line_number: int):
+        latitude = row.get('latitude', row.get('lat'))
+        longitude = row.get('longitude', row.get('lon'))
+        if latitude in (None, '') or longitude in (None, ''):
+            raise ValueError("missing latitude/longitude")
+        point = {
+            "id": line_number if row.get('id') in (None, '') else row['id'],
+            "latitude": float(latitude),
+            "longitude": float(longitude)
+        }
+        for key, cast in (('radius', float), ('limit', int)):
+            if row.get(key) not in (None, ''):
+                point[key] = cast(row[key])
+        return point
 
+    if path != '-' and Path(path).suffix.lower() == '.csv':
+        with open(path, 'r', newline='') as f:
+            for line_number, row in enumerate(csv.DictReader(f), start=2):
+                yield record(row, line_number)
+        return
 
-            # Enhance restaurants with phone and website info
-            enhanced_restaurants = []
-            for restaurant in restaurants:
-                # Extract phone and website from tags
-                tags = restaurant.get('tags', {})
-                phone = tags.get('phone') or tags.get('contact:phone')
-                website = tags.get('website') or tags.get('contact:website')
+    f = sys.stdin if path == '-' else open(path, 'r')
+    try:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield {"id": line_number, "error": f"{path}:{line_number}: {e}"}
+                continue
+            yield record(row, line_number)
+    finally:
+        if f is not sys.stdin:
+            f.close()
 
-                # Add phone and website to restaurant data
-                enhanced_restaurant = restaurant.copy()
-                enhanced_restaurant['phone'] = phone
-                enhanced_restaurant['website'] = website
-                enhanced_restaurants.append(enhanced_restaurant)
+async def run_batch(path: str, radius: int = 500, limit: int = 10, timeout: float = 30.0,
+                    concurrency: int = 16, pool_size: int = 1, use_tool_cache: bool = True,
+                    offline_index: str = None, user_profile: dict = None, completion_cache: str = None,
+                    out=None):
+    """Resolve restaurants for every coordinate in a batch file, writing one NDJSON line per point
 
+    Points are fanned out over one warm MCP server pool (or the offline index)
+    with at most `concurrency` in flight; results are written in completion
+    order, each tagged with the point's id. Returns (succeeded, failed).
+    """
+    out = out or sys.stdout
+    llm_cache = CompletionCache(path=completion_cache) if completion_cache else None
+    mistral_client = MistralClient(env_vars, cache=llm_cache)
+    mistral_client.start_warm_up()
+    index = OfflinePlaceIndex.load(offline_index) if offline_index else None
+    pool = None
+    place_cache = NearbyPlacesTileCache()
+    counts = {"success": 0, "error": 0}
+
+    async def resolve(point: dict):
+        if 'error' in point:
+            counts["error"] += 1
+            write_json_line(out, {"id": point['id'], "status": "error", "error": point['error']})
+            return
+        point_radius = point.get('radius', radius)
+        point_limit = point.get('limit', limit)
+        lat, lon = point['latitude'], point['longitude']
+        try:
+            with timings.span("find_nearby_places"):
+                if index is not None:
+                    places_data = index.find_nearby_places(lat, lon, point_radius, ["amenity"], point_limit)
+                else:
+                    places_data = await find_nearby_places(pool, lat, lon, point_radius, ["amenity"], point_limit,
+                                                           cache=place_cache, timeout=timeout)
+            with timings.span("enrichment"):
+                result = await recommend_restaurants(mistral_client, places_data, lat, lon, point_limit,
+                                                     user_profile)
+        except Exception as e:
             result = {
-                "status": "success",
+                "status": "error",
                 "location": {
                     "latitude": lat,
                     "longitude": lon
                 },
-                "restaurants_found": len(enhanced_restaurants),
-                "restaurants": enhanced_restaurants
+                "error": str(e)
             }
+        counts[result["status"]] += 1
+        with timings.span("output"):
+            write_json_line(out, {"id": point['id'], **result})
+
+    point_queue = asyncio.Queue(maxsize=concurrency * 2)
+
+    async def worker():
+        while True:
+            point = await point_queue.get()
+            try:
+                if point is None:
+                    return
+                with log_fields(request_id=point['id']):
+                    await resolve(point)
+            finally:
+                point_queue.task_done()
+
+    try:
+        if index is None:
+            pool = await MCPServerPool(size=pool_size, tool_cache=ToolCatalogCache() if use_tool_cache else None,
+                                       client_options={"request_timeout": timeout}).start()
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        try:
+            points = read_batch_points(path)
+            # stdin and pipes can block for as long as the producer likes; read them
+            # off the event loop so results keep streaming while input trickles in
+            blocking = path == '-' or not Path(path).is_file()
+            while True:
+                point = await asyncio.to_thread(next, points, None) if blocking else next(points, None)
+                if point is None:
+                    break
+                await point_queue.put(point)
+        finally:
+            for _ in workers:
+                await point_queue.put(None)
+            await asyncio.gather(*workers)
+        logger.info(f"📦 Batch finished: {counts['success']} succeeded, {counts['error']} failed "
+                    f"(tile cache hits {place_cache.hits}, misses {place_cache.misses})")
+        return counts["success"], counts["error"]
+    finally:
+        if pool is not None:
+            await pool.close()
+        await mistral_client.aclose()
+        if llm_cache is not None:
+            llm_cache.close()
+
+class RestaurantService:
+    """Long-running HTTP service keeping the MCP pool, tile cache and Mistral client warm
+
+    A deliberately small HTTP/1.1 server on asyncio streams (keep-alive, JSON
+    bodies only) so the frontend can query the pipeline without paying process
+    and MCP handshake startup per request:
+
+      GET  /nearby?lat=..&lon=..[&radius=..&limit=..]  -> restaurants near a point, nearest first
+      POST /rank  {"restaurants": [...], "profile": {...}, "topK": n}  -> ranking of the given places
+      POST /rank  {"latitude": .., "longitude": .., "radius": .., "limit": .., "profile": {...}}
+                                                       -> search + ranking, same shape as the CLI result
+      GET  /health                                     -> liveness and cache counters
+      GET  /timings                                    -> per-stage latency percentiles
+      GET  /metrics                                    -> Prometheus text exposition
+    """
+
+    MAX_BODY_BYTES = 1024 * 1024
+    PATHS = ("/nearby", "/rank", "/health", "/timings", "/metrics")
+    REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error", 502: "Bad Gateway"}
+
+    def __init__(self, radius: int = 500, limit: int = 10, timeout: float = 30.0, pool_size: int = 1,
+                 use_tool_cache: bool = True, offline_index: str = None, user_profile: dict = None,
+                 completion_cache: str = None):
+        self.radius = radius
+        self.limit = limit
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.user_profile = user_profile
+        self.tool_cache = ToolCatalogCache() if use_tool_cache else None
+        self.index = OfflinePlaceIndex.load(offline_index) if offline_index else None
+        self.llm_cache = CompletionCache(path=completion_cache) if completion_cache else None
+        self.mistral_client = MistralClient(env_vars, cache=self.llm_cache)
+        self.place_cache = NearbyPlacesTileCache()
+        self.pool = None
+        self.server = None
+        # Open connections: handler task -> its StreamWriter
+        self.connections = {}
+        self.active_requests = 0
+        self.requests_served = 0
+        self._http_requests_total = metrics_registry.counter(
+            "http_requests_total", "Service requests by path and status", ("path", "status"))
+        self._http_in_flight = metrics_registry.gauge("http_in_flight_requests", "Service requests being handled")
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000):
+        """Warm the upstream clients and start listening"""
+        self.mistral_client.start_warm_up()
+        if self.index is None:
+            self.pool = await MCPServerPool(size=self.pool_size, tool_cache=self.tool_cache,
+                                            client_options={"request_timeout": self.timeout}).start()
+        self.server = await asyncio.start_server(self._handle_connection, host, port)
+        bound = self.server.sockets[0].getsockname()
+        logger.info(f"🌐 Serving on http://{bound[0]}:{bound[1]} (/nearby, /rank, /health)")
+        return self
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self, drain_timeout: float = 10.0):
+        """Stop accepting connections, let in-flight requests finish, then release the clients
+
+        Idle keep-alive connections are closed from here rather than by
+        cancelling their handler tasks (which belong to asyncio's streams),
+        and only then is the server awaited: since Python 3.12
+        Server.wait_closed() waits for every connection to go away.
+        """
+        if self.server is not None:
+            self.server.close()
+        try:
+            await asyncio.wait_for(self.idle.wait(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️  {self.active_requests} requests still running after {drain_timeout}s - "
+                           "closing their connections")
+        for writer in list(self.connections.values()):
+            writer.close()
+        if self.connections:
+            await asyncio.wait(list(self.connections), timeout=drain_timeout)
+        if self.server is not None:
+            try:
+                await asyncio.wait_for(self.server.wait_closed(), drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("⚠️  Server connections did not close in time")
+        if self.pool is not None:
+            await self.pool.close()
+        await self.mistral_client.aclose()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+        logger.info("👋 Service stopped")
+
+    async def serve_forever(self, host: str = "127.0.0.1", port: int = 8000):
+        """Run until SIGINT/SIGTERM, then shut down gracefully"""
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await self.start(host, port)
+        try:
+            await stop.wait()
+            logger.info("🛑 Shutting down...")
+        finally:
+            await self.close()
 
-            print(json.dumps(result, indent=2))
-            return result
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                    if not request_line:
+                        return
+                    method, target, version = request_line.decode('latin-1').split()
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length') or 0)
+                    if length < 0:
+                        raise ValueError("negative Content-Length")
+                except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    await self._respond(writer, 400, {"error": "malformed request"}, keep_alive=False)
+                    return
+                if length > self.MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version.upper() != 'HTTP/1.0' and not self.server_closing)
+
+                self.active_requests += 1
+                self.requests_served += 1
+                self._http_in_flight.inc()
+                self.idle.clear()
+                try:
+                    with log_fields(request_id=self.requests_served):
+                        status, payload = await self._dispatch(method.upper(), target, body)
+                finally:
+                    self.active_requests -= 1
+                    self._http_in_flight.dec()
+                    if not self.active_requests:
+                        self.idle.set()
+                path = urlsplit(target).path
+                self._http_requests_total.inc(path=path if path in self.PATHS else "other", status=status)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.pop(task, None)
+            writer.close()
+
+    @property
+    def server_closing(self) -> bool:
+        return self.server is None or not self.server.is_serving()
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool):
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), "text/plain; version=0.0.4; charset=utf-8"
         else:
-            result = {
-                "status": "success",
-                "location": {
-                    "latitude": lat,
-                    "longitude": lon
-                },
-                "restaurants_found": 0,
-                "restaurants": []
-            }
-            print(json.dumps(result, indent=2))
-            return result
+            body, content_type = json_codec.dumps(payload), "application/json"
+        head = (f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _dispatch(self, method: str, target: str, body: bytes):
+        url = urlsplit(target)
+        routes = {"/nearby": ("GET", self.nearby), "/rank": ("POST", self.rank), "/health": ("GET", self.health),
+                  "/timings": ("GET", self.timings), "/metrics": ("GET", self.metrics)}
+        if url.path not in routes:
+            return 404, {"error": f"unknown path {url.path}"}
+        allowed, handler = routes[url.path]
+        if method != allowed:
+            return 405, {"error": f"{url.path} only accepts {allowed}"}
+        try:
+            if method == "GET":
+                params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            else:
+                params = json_codec.loads(body or b'{}')
+                if not isinstance(params, dict):
+                    raise ValueError("request body must be a JSON object")
+        except ValueError as e:
+            return 400, {"error": f"invalid request: {e}"}
+        try:
+            with timings.span(f"http{url.path}"):
+                return 200, await handler(params)
+        except (ValueError, TypeError, KeyError) as e:
+            return 400, {"error": f"invalid request: {e}"}
+        except (RuntimeError, ConnectionError, asyncio.TimeoutError) as e:
+            logger.error(f"❌ Upstream failure on {url.path}: {e!r}")
+            return 502, {"error": str(e) or repr(e)}
+        except Exception as e:
+            logger.exception(f"❌ Error handling {url.path}")
+            return 500, {"error": str(e) or repr(e)}
+
+    def _point(self, params: dict):
+        latitude = float(params.get('latitude', params.get('lat')))
+        longitude = float(params.get('longitude', params.get('lon')))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValueError("coordinates out of range")
+        radius = float(params.get('radius') or self.radius)
+        limit = int(params.get('limit') or self.limit)
+        return latitude, longitude, radius, limit
+
+    async def _search(self, latitude: float, longitude: float, radius: float, limit: int) -> dict:
+        with timings.span("find_nearby_places"):
+            if self.index is not None:
+                return self.index.find_nearby_places(latitude, longitude, radius, ["amenity"], limit)
+            return await find_nearby_places(self.pool, latitude, longitude, radius, ["amenity"], limit,
+                                            cache=self.place_cache, timeout=self.timeout)
+
+    async def nearby(self, params: dict) -> dict:
+        latitude, longitude, radius, limit = self._point(params)
+        places_data = await self._search(latitude, longitude, radius, limit)
+        restaurants = nearest_places(extract_restaurants(places_data) if places_data else [],
+                                     latitude, longitude, limit)
+        return {
+            "location": {
+                "latitude": latitude,
+                "longitude": longitude
+            },
+            "radius": radius,
+            "restaurants": restaurants
+        }
+
+    async def rank(self, params: dict) -> dict:
+        profile = params.get('profile') or self.user_profile
+        if 'restaurants' in params:
+            places = params['restaurants']
+            if not isinstance(places, list) or not all(isinstance(place, dict) for place in places):
+                raise ValueError("restaurants must be a list of objects")
+            top_k = int(params.get('topK') or len(places))
+            with timings.span("enrichment"):
+                return await rank_restaurants(self.mistral_client, places, profile, top_k=top_k)
+        latitude, longitude, radius, limit = self._point(params)
+        places_data = await self._search(latitude, longitude, radius, limit)
+        with timings.span("enrichment"):
+            return await recommend_restaurants(self.mistral_client, places_data, latitude, longitude, limit,
+                                               profile)
+
+    async def timings(self, params: dict) -> dict:
+        return timings.summary()
+
+    async def metrics(self, params: dict) -> str:
+        return metrics_registry.exposition(timings)
+
+    async def health(self, params: dict) -> dict:
+        return {
+            "status": "ok",
+            "source": "offline-index" if self.index is not None else "mcp",
+            "activeRequests": self.active_requests,
+            "tileCache": {"hits": self.place_cache.hits, "misses": self.place_cache.misses}
+        }
+
+def write_result(result: dict, output: str = "json", out=None):
+    """Write a recommendation result as pretty JSON or as NDJSON
+
+    NDJSON is a "header" record (everything but the restaurants) followed by one
+    compact line per restaurant in rank order, flushed as each is written so a
+    consumer can start on the best match before the rest arrive.
+    """
+    out = out or sys.stdout
+    if output != "ndjson":
+        out.write(json_codec.dumps(result, indent=True).decode('utf-8') + '\n')
+        out.flush()
+        return
+    header = {key: value for key, value in result.items() if key != 'restaurants'}
+    write_json_line(out, {"record": "header", **header})
+    for rank, restaurant in enumerate(result.get('restaurants', []), start=1):
+        write_json_line(out, {**restaurant, "record": "restaurant", "rank": rank})
+
+async def main(radius: int = 500, limit: int = 10, timeout: float = 30.0, use_tool_cache: bool = True,
+               offline_index: str = None, user_profile: dict = None, completion_cache: str = None,
+               output: str = "json"):
+    """Main function demonstrating MCP OSM + Mistral integration"""
+
+    # Initialize clients
+    osm_client = MCPOSMClient(request_timeout=timeout)
+    tool_cache = ToolCatalogCache() if use_tool_cache else None
+    llm_cache = CompletionCache(path=completion_cache) if completion_cache else None
+    mistral_client = MistralClient(env_vars, cache=llm_cache)
+
+    try:
+        # Open the Mistral connection while the place search runs
+        mistral_client.start_warm_up()
+
+        # Use hardcoded coordinates: 52°21'40.8"N 4°55'05.1"E
+        lat = 52.3613333  # 52°21'40.8"N
+        lon = 4.9180833   # 4°55'05.1"E
+
+        if offline_index:
+            logger.info(f"🗂️  Loading offline place index {offline_index}...")
+            with timings.span("load_index"):
+                index = OfflinePlaceIndex.load(offline_index)
+            logger.info(f"📍 Using coordinates: {lat}, {lon}")
+            logger.info("🍽️  Finding nearby restaurants...")
+            with timings.span("find_nearby_places"):
+                places_data = index.find_nearby_places(lat, lon, radius, ["amenity"], limit)
+        else:
+            # Connect to MCP server
+            with timings.span("connect_to_server"):
+                connected = await osm_client.connect_to_server()
+            if not connected:
+                return
+
+            # Initialize MCP connection
+            logger.info("🔌 Initializing MCP connection...")
+            with timings.span("initialize"):
+                init_response = await osm_client.initialize()
+            logger.debug("Initialization: %s", LoggedPayload(init_response))
+
+            # List available tools and search concurrently; the search only
+            # needs an initialized session, not the catalogue
+            logger.info("🛠️  Listing available tools...")
+            logger.info(f"📍 Using coordinates: {lat}, {lon}")
+            logger.info("🍽️  Finding nearby restaurants...")
+            available_tools, places_data = await asyncio.gather(
+                timings.timed("list_tools", osm_client.get_tools(tool_cache)),
+                timings.timed("find_nearby_places",
+                              find_nearby_places(osm_client, lat, lon, radius, ["amenity"], limit))
+            )
+            logger.info(f"Available tools ({len(available_tools)}):")
+            for tool in available_tools:
+                logger.info(f"  - {tool['name']}: {tool.get('description', 'No description')}")
+
+            if not available_tools:
+                logger.error("❌ No tools available - something might be wrong with the MCP server")
+                return
+
+        with timings.span("enrichment"):
+            result = await recommend_restaurants(mistral_client, places_data, lat, lon, limit, user_profile)
+        with timings.span("output"):
+            write_result(result, output)
+        return result
 
     except Exception as e:
         result = {
             "status": "error",
             "error": str(e)
         }
-        print(json.dumps(result, indent=2))
+        write_result(result, output)
         return result
     finally:
         # Clean up
         await osm_client.close()
+        await mistral_client.aclose()
+        if llm_cache is not None:
+            llm_cache.close()
+
+def _task_name(coro) -> str:
+    return getattr(coro, '__qualname__', None) or type(coro).__name__
+
+async def _run_with_task_timings(coro, task_timer: StageTimer):
+    """Await coro with a task factory recording each asyncio task's lifetime, keyed by coroutine name"""
+    loop = asyncio.get_running_loop()
+
+    def factory(loop, task_coro, context=None):
+        kwargs = {"context": context} if context is not None else {}
+        task = asyncio.Task(task_coro, loop=loop, **kwargs)
+        name, start = _task_name(task_coro), time.perf_counter()
+        task.add_done_callback(lambda _: task_timer.record(name, time.perf_counter() - start))
+        return task
+
+    loop.set_task_factory(factory)
+    return await coro
+
+class StackSampler:
+    """Samples the event loop thread's stack from a background thread into folded-stack counts
+
+    The output (`frame;frame;frame count` per line) is what flamegraph.pl,
+    speedscope and inferno read.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1]))
+
+def run_profiled(coro, mode: str = None, profile_dir: str = "profiles", top: int = 15):
+    """asyncio.run(coro), optionally under cProfile, tracemalloc or a stack sampler
+
+    Profiles go to profile_dir: profile.prof plus a cumulative-time listing
+    (cprofile), the top allocating lines (tracemalloc) or folded stacks for
+    flame graphs (sampling). Every mode also records asyncio task lifetimes
+    by coroutine into tasks.txt. Without a mode this is plain asyncio.run.
+    """
+    if not mode:
+        return asyncio.run(coro)
+
+    out = Path(profile_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    task_timer = StageTimer()
+    profiler = sampler = None
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif mode == "tracemalloc":
+        tracemalloc.start()
+    elif mode == "sampling":
+        sampler = StackSampler().start()
+    else:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    try:
+        return asyncio.run(_run_with_task_timings(coro, task_timer))
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(out / "profile.prof")
+            with open(out / "profile.txt", 'w') as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(top * 3)
+            logger.info(f"🔬 cProfile stats written to {out / 'profile.prof'} (listing in profile.txt)")
+        elif mode == "tracemalloc":
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")
+            ])
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            snapshot.dump(str(out / "tracemalloc.snapshot"))
+            stats = snapshot.statistics("lineno")
+            lines = [f"current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB"]
+            lines.extend(str(stat) for stat in stats[:top])
+            (out / "tracemalloc.txt").write_text('\n'.join(lines) + '\n')
+            logger.info(f"🔬 Top allocators (peak {peak / 1024:.1f} KiB), full list in {out / 'tracemalloc.txt'}:")
+            for stat in stats[:5]:
+                logger.info(f"  {stat}")
+        elif sampler is not None:
+            sampler.stop()
+            (out / "stacks.folded").write_text(sampler.folded())
+            logger.info(f"🔬 {sampler.samples} stack samples written to {out / 'stacks.folded'} "
+                        "(flamegraph.pl / speedscope format)")
+        (out / "tasks.txt").write_text(task_timer.report() + '\n')
+        logger.info(f"🔬 asyncio task timings written to {out / 'tasks.txt'}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='MCP OSM server client with Mistral AI integration')
     parser.add_argument('--log-level', default='INFO',
                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                        help='Set the logging level (default: INFO)')
+    parser.add_argument('--log-format', default='text', choices=['text', 'json'],
+                       help='Log line format; json writes one object per line with per-stage fields (default: text)')
+    parser.add_argument('--debug-sample-rate', type=float, default=1.0,
+                       help='Fraction of DEBUG records to keep (default: 1.0)')
+    parser.add_argument('--radius', type=int, default=500,
+                       help='Search radius in meters (default: 500)')
+    parser.add_argument('--limit', type=int, default=10,
+                       help='Maximum number of places to request (default: 10)')
+    parser.add_argument('--timeout', type=float, default=30.0,
+                       help='Per-request MCP timeout in seconds (default: 30)')
+    parser.add_argument('--no-tool-cache', action='store_true',
+                       help='Always fetch tools/list instead of using the on-disk catalogue cache')
+    parser.add_argument('--offline-index', metavar='PATH',
+                       help='Answer nearby searches from a local place index instead of the MCP server')
+    parser.add_argument('--build-index', nargs=2, metavar=('SOURCE', 'PATH'),
+                       help='Build a place index from an Overpass JSON dump or OSM PBF extract and exit')
+    parser.add_argument('--user-profile', metavar='PATH',
+                       help='JSON user profile for ranking (same shape as the frontend UserProfile)')
+    parser.add_argument('--completion-cache', nargs='?', metavar='PATH',
+                       const=str(default_cache_dir() / "completions.sqlite"),
+                       help='Cache Mistral ranking completions in a SQLite file '
+                            '(default path under the tabletalk cache directory)')
+    parser.add_argument('--output', choices=['json', 'ndjson'], default='json',
+                       help='Result format: one pretty-printed document, or a header line followed by one '
+                            'compact line per restaurant (default: json)')
+    parser.add_argument('--json-codec', choices=['auto', 'orjson', 'msgspec', 'json'], default='auto',
+                       help='JSON implementation for the MCP transport and output (default: auto, the '
+                            'fastest installed)')
+    parser.add_argument('--timings', nargs='?', const='-', metavar='PATH',
+                       help='At exit, print per-stage latency percentiles to stderr, or write them as JSON to PATH')
+    parser.add_argument('--metrics-file', metavar='PATH',
+                       help='At exit, write counters and stage latencies in Prometheus text format to PATH '
+                            '(serve mode also exposes them at /metrics)')
+    parser.add_argument('--profile', choices=['cprofile', 'tracemalloc', 'sampling'],
+                       help='Profile the run: cProfile stats, top allocators, or sampled stacks for flame graphs; '
+                            'asyncio task timings are recorded in every mode')
+    parser.add_argument('--profile-dir', default='profiles', metavar='DIR',
+                       help='Directory for profile output (default: profiles)')
+    parser.add_argument('--batch', metavar='FILE',
+                       help="Resolve restaurants for every coordinate in a CSV or NDJSON file ('-' for stdin) "
+                            'and write one NDJSON result per line')
+    parser.add_argument('--concurrency', type=int, default=16,
+                       help='Batch mode: maximum points resolved at once (default: 16)')
+    parser.add_argument('--pool-size', type=int, default=1,
+                       help='Batch and serve modes: number of MCP server processes (default: 1)')
+    parser.add_argument('--serve', action='store_true',
+                       help='Run as a long-lived HTTP service exposing /nearby and /rank')
+    parser.add_argument('--host', default='127.0.0.1',
+                       help='Serve mode: address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000,
+                       help='Serve mode: port to listen on (default: 8000)')
     args = parser.parse_args()
 
-    logger = setup_logging(args.log_level)
-    asyncio.run(main())
+    logger = setup_logging(args.log_level, args.log_format, args.debug_sample_rate)
+    try:
+        json_codec = select_json_codec(args.json_codec)
+    except RuntimeError as e:
+        parser.error(str(e))
+    def dump_timings():
+        if args.timings == '-':
+            sys.stderr.write(timings.report() + '\n')
+        elif args.timings:
+            Path(args.timings).write_bytes(json_codec.dumps(timings.summary(), indent=True))
+        if args.metrics_file:
+            Path(args.metrics_file).write_text(metrics_registry.exposition(timings))
+
+    if args.build_index:
+        OfflinePlaceIndex.from_source(args.build_index[0]).save(args.build_index[1])
+    else:
+        user_profile = None
+        if args.user_profile:
+            with open(args.user_profile, 'r') as f:
+                user_profile = json.load(f)
+        options = dict(radius=args.radius, limit=args.limit, timeout=args.timeout,
+                       use_tool_cache=not args.no_tool_cache, offline_index=args.offline_index,
+                       user_profile=user_profile, completion_cache=args.completion_cache)
+        try:
+            if args.serve:
+                service = RestaurantService(pool_size=args.pool_size, **options)
+                run_profiled(service.serve_forever(args.host, args.port), args.profile, args.profile_dir)
+            elif args.batch:
+                run_profiled(run_batch(args.batch, concurrency=args.concurrency, pool_size=args.pool_size,
+                                       **options), args.profile, args.profile_dir)
+            else:
+                run_profiled(main(output=args.output, **options), args.profile, args.profile_dir)
+        finally:
+            dump_timings()
@@ -0,0 +1,23 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# nomain.py is a standalone script at the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from nomain import OfflinePlaceIndex  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def overpass_fixture():
+    """Recorded Overpass response for Amsterdam Oost"""
+    return Path(__file__).resolve().parent.parent / "fixtures" / "amsterdam_oost_overpass.json"
+
+
+@pytest.fixture
+def offline_index_path(tmp_path, overpass_fixture):
+    """Offline index built from the Overpass fixture, saved under tmp_path"""
+    path = tmp_path / "index.json"
+    OfflinePlaceIndex.from_source(overpass_fixture).save(path)
+    return str(path)
@@ -0,0 +1,59 @@
+"""Minimal MCP stdio server for the transport tests
+
+Each request is answered on its own thread, so delayed calls come back out
+of order. tools/call arguments steer the reply: delay (seconds), value
+(echoed back), size (bytes of padding), raw_before (lines written verbatim
+first). The "cancelled" tool returns the request ids named in
+notifications/cancelled so far; the "exit" tool kills the process.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+lock = threading.Lock()
+cancelled = []
+
+
+def write(line):
+    with lock:
+        sys.stdout.write(line + "\n")
+        sys.stdout.flush()
+
+
+def reply(message, result):
+    write(json.dumps({"jsonrpc": "2.0", "id": message["id"], "result": result}))
+
+
+def text_result(payload):
+    return {"content": [{"type": "text", "text": json.dumps(payload)}]}
+
+
+def handle(message):
+    method = message.get("method")
+    if method == "initialize":
+        reply(message, {"protocolVersion": "2024-11-05", "capabilities": {"tools": {}},
+                        "serverInfo": {"name": "stub-mcp", "version": os.environ.get("STUB_VERSION", "1.0")}})
+    elif method == "tools/list":
+        reply(message, {"tools": [{"name": "echo", "inputSchema": {"type": "object", "properties": {}}}]})
+    elif method == "notifications/cancelled":
+        cancelled.append(message["params"]["requestId"])
+    elif method == "tools/call":
+        name = message["params"]["name"]
+        arguments = message["params"].get("arguments", {})
+        if name == "exit":
+            os._exit(1)
+        if name == "cancelled":
+            reply(message, text_result(list(cancelled)))
+            return
+        time.sleep(arguments.get("delay", 0))
+        for line in arguments.get("raw_before", []):
+            write(line)
+        reply(message, text_result({"value": arguments.get("value"), "padding": "x" * arguments.get("size", 0)}))
+
+
+for line in sys.stdin:
+    if line.strip():
+        threading.Thread(target=handle, args=(json.loads(line),), daemon=True).start()
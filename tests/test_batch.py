@@ -0,0 +1,76 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+from nomain import read_batch_points, run_batch
+
+
+def test_reads_csv_with_overrides_and_reports_bad_rows(tmp_path):
+    path = tmp_path / "points.csv"
+    path.write_text("id,lat,lon,radius,limit\nvenue-1,52.36,4.91,800,3\nvenue-2,52.37,4.92,,\n,,,,\n")
+
+    points = list(read_batch_points(str(path)))
+
+    assert points[0] == {"id": "venue-1", "latitude": 52.36, "longitude": 4.91, "radius": 800.0, "limit": 3}
+    assert points[1] == {"id": "venue-2", "latitude": 52.37, "longitude": 4.92}
+    assert points[2]["id"] == 4 and "missing latitude/longitude" in points[2]["error"]
+
+
+def test_reads_ndjson_and_skips_blank_lines(tmp_path):
+    path = tmp_path / "points.ndjson"
+    path.write_text('{"latitude": 52.36, "longitude": 4.91}\n\nnot json\n')
+
+    points = list(read_batch_points(str(path)))
+
+    assert points[0] == {"id": 1, "latitude": 52.36, "longitude": 4.91}
+    assert points[1]["id"] == 3 and "error" in points[1]
+
+
+def test_offline_batch_writes_one_line_per_point(tmp_path, offline_index_path):
+    points = tmp_path / "points.ndjson"
+    points.write_text("\n".join(
+        json.dumps({"id": i, "latitude": 52.3613 + i * 0.001, "longitude": 4.918}) for i in range(5)
+    ) + "\nbroken\n")
+    out = io.StringIO()
+
+    succeeded, failed = asyncio.run(run_batch(str(points), radius=800, limit=3, concurrency=2,
+                                              offline_index=offline_index_path, out=out))
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert (succeeded, failed) == (5, 1)
+    assert sorted(line["id"] for line in lines if line["status"] == "success") == list(range(5))
+    assert all(len(line["restaurants"]) <= 3 for line in lines if line["status"] == "success")
+
+
+def test_stdin_is_read_without_blocking_the_workers(offline_index_path, monkeypatch):
+    read_fd, write_fd = os.pipe()
+    monkeypatch.setattr(sys, "stdin", os.fdopen(read_fd, "r"))
+    second_sent = []
+
+    def producer():
+        with os.fdopen(write_fd, "w") as pipe:
+            pipe.write(json.dumps({"id": "first", "latitude": 52.3613, "longitude": 4.918}) + "\n")
+            pipe.flush()
+            time.sleep(0.5)
+            second_sent.append(time.monotonic())
+            pipe.write(json.dumps({"id": "second", "latitude": 52.362, "longitude": 4.919}) + "\n")
+
+    class Recorder(io.StringIO):
+        written = {}
+
+        def write(self, text):
+            self.written[json.loads(text)["id"]] = time.monotonic()
+            return super().write(text)
+
+    out = Recorder()
+    thread = threading.Thread(target=producer)
+    thread.start()
+    succeeded, failed = asyncio.run(run_batch("-", radius=800, limit=3, offline_index=offline_index_path, out=out))
+    thread.join()
+
+    assert (succeeded, failed) == (2, 0)
+    assert out.written["first"] < second_sent[0] < out.written["second"]
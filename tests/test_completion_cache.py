@@ -0,0 +1,45 @@
+import asyncio
+
+from nomain import CompletionCache
+
+
+def test_key_normalizes_whitespace_and_includes_params():
+    messages = [{"role": "user", "content": " rank these \n"}]
+    key = CompletionCache.make_key("m", messages, {"temperature": 0})
+    assert key == CompletionCache.make_key("m", [{"role": "user", "content": "rank these"}], {"temperature": 0})
+    assert key != CompletionCache.make_key("m", messages, {"temperature": 0.7})
+    assert key != CompletionCache.make_key("other", messages, {"temperature": 0})
+
+
+def test_memory_tier_is_lru_bounded():
+    async def run():
+        cache = CompletionCache(max_entries=2)
+        for key in ("a", "b", "c"):
+            await cache.put(key, {"id": key})
+        return [await cache.get(key) for key in ("a", "b", "c")], cache
+
+    results, cache = asyncio.run(run())
+    assert results == [None, {"id": "b"}, {"id": "c"}]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_disk_tier_survives_restart_and_is_pruned(tmp_path):
+    path = tmp_path / "completions.sqlite"
+
+    async def fill():
+        cache = CompletionCache(path=path, max_disk_entries=5, prune_interval=1)
+        await asyncio.gather(*(cache.put(f"k{i}", {"i": i}) for i in range(20)))
+        cache.close()
+
+    async def read():
+        cache = CompletionCache(path=path)
+        try:
+            return await cache.get("k19"), cache.disk_hits, cache._db.execute(
+                "SELECT COUNT(*) FROM completions").fetchone()[0]
+        finally:
+            cache.close()
+
+    asyncio.run(fill())
+    response, disk_hits, rows = asyncio.run(read())
+    assert response == {"i": 19} and disk_hits == 1
+    assert rows <= 5
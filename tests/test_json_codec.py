@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+
+import nomain
+from nomain import JSONCodec, select_json_codec, write_json_line
+
+CODECS = [name for name, module in (("json", json), ("orjson", nomain.orjson), ("msgspec", nomain.msgspec))
+          if module is not None]
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codecs_round_trip_bytes_and_reject_bad_input(name):
+    codec = select_json_codec(name)
+    message = {"jsonrpc": "2.0", "id": 7, "result": {"name": "Café Ñ", "tags": [1, 2.5, None, True]}}
+
+    encoded = codec.dumps(message)
+
+    assert isinstance(encoded, bytes) and b"\n" not in encoded
+    assert codec.loads(encoded) == codec.loads(bytearray(encoded)) == codec.loads(encoded.decode()) == message
+    assert json.loads(codec.dumps(message, indent=True)) == message
+    with pytest.raises(ValueError):
+        codec.loads(b'{"id": ')
+
+
+def test_unknown_codec_and_stdlib_fallback():
+    with pytest.raises(ValueError):
+        select_json_codec("yaml")
+    huge = {"id": 2 ** 70}
+    assert JSONCodec().loads(select_json_codec("auto").dumps(huge)) == huge
+
+
+def test_write_json_line_text_stream():
+    out = io.StringIO()
+    write_json_line(out, {"a": "é"})
+    assert out.getvalue() == '{"a":"é"}\n'
@@ -0,0 +1,68 @@
+import json
+import logging
+import threading
+
+import pytest
+
+from nomain import DebugSampler, JSONLogFormatter, LogFieldsFilter, log_fields, setup_logging, stop_logging
+
+
+def make_record(level=logging.INFO, message="🍽️  Finding nearby restaurants...", **extra):
+    record = logging.LogRecord("nomain", level, __file__, 1, message, None, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_json_lines_carry_task_local_and_explicit_fields():
+    record = make_record(duration_ms=12.5)
+    with log_fields(request_id="venue-1", stage="search"):
+        LogFieldsFilter().filter(record)
+    outside = make_record()
+    LogFieldsFilter().filter(outside)
+
+    entry = json.loads(JSONLogFormatter().format(record))
+
+    assert entry["message"] == "🍽️  Finding nearby restaurants..."
+    assert (entry["request_id"], entry["stage"], entry["duration_ms"]) == ("venue-1", "search", 12.5)
+    assert "stage" not in json.loads(JSONLogFormatter().format(outside))
+
+
+def test_debug_sampler_only_drops_debug_records():
+    sampler = DebugSampler(rate=0.0)
+
+    assert not sampler.filter(make_record(logging.DEBUG))
+    assert sampler.filter(make_record(logging.INFO))
+    assert DebugSampler(rate=1.0).filter(make_record(logging.DEBUG))
+
+
+@pytest.fixture
+def restore_logging():
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    yield
+    stop_logging()
+    root.handlers[:] = handlers
+    root.setLevel(level)
+
+
+def test_records_are_formatted_on_the_listener_thread(capsys, restore_logging):
+    formatted_on = []
+
+    class Payload:
+        def __str__(self):
+            formatted_on.append(threading.current_thread())
+            return "payload"
+
+    logger = setup_logging("INFO", "json")
+    logger.info("📥 Received: %s", Payload())
+    try:
+        raise RuntimeError("upstream down")
+    except RuntimeError:
+        logger.exception("❌ Request failed")
+    stop_logging()
+
+    entries = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert formatted_on and threading.main_thread() not in formatted_on
+    assert entries[0]["message"] == "📥 Received: payload"
+    assert entries[1]["message"] == "❌ Request failed"
+    assert "RuntimeError: upstream down" in entries[1]["exception"]
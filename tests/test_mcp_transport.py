@@ -0,0 +1,116 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+from nomain import MCPOSMClient, MCPServerPool, MetricsRegistry, parse_tool_text
+
+STUB = (sys.executable, str(Path(__file__).resolve().parent / "stub_mcp_server.py"))
+
+
+def with_client(scenario, **options):
+    async def run():
+        client = MCPOSMClient(command=STUB, **options)
+        assert await client.connect_to_server()
+        await client.initialize()
+        try:
+            return await scenario(client)
+        finally:
+            await client.close()
+
+    return asyncio.run(run())
+
+
+async def echo(client, **arguments):
+    return parse_tool_text(await client.call_tool("echo", arguments, coalesce=False))
+
+
+def test_out_of_order_responses_reach_their_callers():
+    async def scenario(client):
+        finished = []
+
+        async def call(value, delay):
+            result = await echo(client, value=value, delay=delay)
+            finished.append(value)
+            return result["value"]
+
+        values = await asyncio.gather(call("slow", 0.3), call("fast", 0), call("middle", 0.15))
+        return values, finished, client.in_flight
+
+    values, finished, in_flight = with_client(scenario)
+
+    assert values == ["slow", "fast", "middle"]
+    assert finished == ["fast", "middle", "slow"]
+    assert in_flight == 0
+
+
+def test_frames_larger_than_the_stream_limit_are_reassembled():
+    async def scenario(client):
+        return await echo(client, value="big", size=200_000)
+
+    result = with_client(scenario, stream_limit=4096)
+
+    assert result["value"] == "big" and len(result["padding"]) == 200_000
+
+
+def test_oversized_frame_fails_only_its_own_request():
+    async def scenario(client):
+        return await asyncio.gather(
+            echo(client, value="small", delay=0.3),
+            echo(client, value="huge", size=100_000),
+            return_exceptions=True
+        )
+
+    small, huge = with_client(scenario, stream_limit=4096, max_message_size=50_000)
+
+    assert small["value"] == "small"
+    assert isinstance(huge, ValueError) and "max_message_size" in str(huge)
+
+
+def test_timeout_sends_cancelled_and_drops_the_late_reply():
+    async def scenario(client):
+        with pytest.raises(asyncio.TimeoutError):
+            await client.call_tool("echo", {"value": "late", "delay": 0.5}, timeout=0.1)
+        await asyncio.sleep(0.6)
+        cancelled = parse_tool_text(await client.call_tool("cancelled", {}))
+        after = await echo(client, value="next")
+        return cancelled, after, client.is_alive()
+
+    cancelled, after, alive = with_client(scenario)
+
+    assert cancelled == [2]
+    assert after["value"] == "next" and alive
+
+
+def test_non_object_and_non_json_lines_are_skipped():
+    async def scenario(client):
+        first = await echo(client, value="one", raw_before=["42", "[1, 2]", "null", "not json"])
+        second = await echo(client, value="two")
+        return first, second, client.is_alive()
+
+    first, second, alive = with_client(scenario)
+
+    assert (first["value"], second["value"], alive) == ("one", "two", True)
+
+
+def test_pool_restarts_a_killed_slot():
+    async def run():
+        registry = MetricsRegistry()
+        async with MCPServerPool(size=2, health_check_interval=0.1, client_options={"command": STUB},
+                                 metrics=registry) as pool:
+            killed = pool._clients[0]
+            killed.process.kill()
+            await killed.process.wait()
+
+            result = parse_tool_text(await pool.call_tool("echo", {"value": "still up"}))
+            for _ in range(50):
+                if pool._clients[0] is not killed and pool._clients[0].is_alive():
+                    break
+                await asyncio.sleep(0.1)
+            return result, pool._clients[0] is not killed, registry.counter("mcp_restarts_total", "").value()
+
+    result, replaced, restarts = asyncio.run(run())
+
+    assert result["value"] == "still up"
+    assert replaced and restarts == 1
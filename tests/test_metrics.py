@@ -0,0 +1,72 @@
+import asyncio
+
+import httpx
+import pytest
+
+from nomain import MetricsRegistry, MistralClient, SingleFlight, StageTimer
+
+
+def test_exposition_renders_counters_gauges_and_stage_summaries():
+    registry = MetricsRegistry()
+    requests = registry.counter("mcp_requests_total", "MCP JSON-RPC requests sent", ("method",))
+    requests.inc(method="tools/call")
+    requests.inc(2, method="tools/call")
+    registry.gauge("mcp_in_flight_requests", "MCP requests awaiting a response").inc()
+    registry.counter("cache_hits_total", "Cache lookups answered", ("cache",)).inc(cache='a"b\\c')
+    timer = StageTimer()
+    timer.record("initialize", 0.25)
+
+    text = registry.exposition(timer)
+
+    assert "# TYPE tabletalk_mcp_requests_total counter" in text
+    assert 'tabletalk_mcp_requests_total{method="tools/call"} 3' in text
+    assert "tabletalk_mcp_in_flight_requests 1" in text
+    assert 'tabletalk_cache_hits_total{cache="a\\"b\\\\c"} 1' in text
+    assert 'tabletalk_stage_duration_seconds{stage="initialize",quantile="0.99"} 0.25' in text
+    assert 'tabletalk_stage_duration_seconds_count{stage="initialize"} 1' in text
+    with pytest.raises(ValueError):
+        registry.gauge("mcp_requests_total", "clash")
+
+
+def test_clients_report_into_the_registry_they_are_given():
+    registry = MetricsRegistry()
+
+    async def run():
+        flight = SingleFlight(registry)
+
+        async def work():
+            await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(flight.do("same", work) for _ in range(3)))
+
+        def handler(request):
+            return httpx.Response(200, json={"choices": [{"message": {"content": "{}"}}],
+                                             "usage": {"prompt_tokens": 120, "completion_tokens": 30}})
+        client = MistralClient({"MISTRAL_API_KEY": "test", "MISTRAL_REQUESTS_PER_SECOND": "1000"},
+                               metrics=registry)
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://mistral.test")
+        await client.chat_completion([{"role": "user", "content": "hi"}])
+        await client.aclose()
+
+    asyncio.run(run())
+
+    assert registry.counter("singleflight_coalesced_total", "").value() == 2
+    tokens = registry.counter("mistral_tokens_total", "", ("kind",))
+    assert (tokens.value(kind="prompt"), tokens.value(kind="completion")) == (120, 30)
+    assert registry.counter("mistral_requests_total", "", ("status",)).value(status=200) == 1
+
+
+def test_large_and_fractional_values_keep_full_precision():
+    registry = MetricsRegistry()
+    tokens = registry.counter("mistral_tokens_total", "Mistral tokens consumed", ("kind",))
+    tokens.inc(1_234_607, kind="prompt")
+    tokens.inc(1, kind="prompt")
+    registry.gauge("ratio", "A fractional gauge").set(0.1234567891)
+    timer = StageTimer()
+    timer.record("find_nearby_places", 1234.567891)
+
+    text = registry.exposition(timer)
+
+    assert 'tabletalk_mistral_tokens_total{kind="prompt"} 1234608' in text
+    assert "tabletalk_ratio 0.1234567891" in text
+    assert 'tabletalk_stage_duration_seconds_sum{stage="find_nearby_places"} 1234.567891' in text
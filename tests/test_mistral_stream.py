@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import httpx
+
+from nomain import MistralClient, collect_stream
+
+
+def sse(*events, trailing_blank=True):
+    body = ": keep-alive\n\n"
+    body += "\n\n".join(f"data: {event}" for event in events)
+    return body + ("\n\n" if trailing_blank else "")
+
+
+def delta(content):
+    return json.dumps({"choices": [{"delta": {"content": content}}]})
+
+
+def make_client(handler):
+    client = MistralClient({"MISTRAL_API_KEY": "test", "MISTRAL_REQUESTS_PER_SECOND": "1000"},
+                           backoff_base=0.001, max_concurrency=1)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://mistral.test")
+    return client
+
+
+def stream_handler(body, requests=None):
+    def handler(request):
+        if requests is not None:
+            requests.append(json.loads(request.content))
+        return httpx.Response(200, content=body.encode(), headers={"content-type": "text/event-stream"})
+    return handler
+
+
+def test_deltas_are_accumulated():
+    async def run():
+        requests = []
+        client = make_client(stream_handler(sse(delta("Hel"), delta("lo"), "[DONE]"), requests))
+        async with client.chat_completion_stream([{"role": "user", "content": "hi"}],
+                                                 model="mistral-large-latest", temperature=0) as deltas:
+            message = await collect_stream(deltas)
+        await client.aclose()
+        return message, requests[0]
+
+    message, request = asyncio.run(run())
+    assert message == {"role": "assistant", "content": "Hello"}
+    assert request["model"] == "mistral-large-latest"
+    assert request["temperature"] == 0 and request["stream"] is True
+
+
+def test_final_event_without_trailing_blank_line_is_kept():
+    async def run():
+        client = make_client(stream_handler(sse(delta("a"), delta("b"), trailing_blank=False)))
+        async with client.chat_completion_stream([]) as deltas:
+            message = await collect_stream(deltas)
+        await client.aclose()
+        return message
+
+    assert asyncio.run(run())["content"] == "ab"
+
+
+def test_breaking_early_releases_the_concurrency_slot():
+    async def run():
+        client = make_client(stream_handler(sse(delta("a"), delta("b"), "[DONE]")))
+        async with client.chat_completion_stream([]) as deltas:
+            async for _ in deltas:
+                break
+        released = not client._semaphore.locked()
+        await client.aclose()
+        return released
+
+    assert asyncio.run(run())
+
+
+def test_retries_before_the_stream_starts():
+    async def run():
+        attempts = []
+
+        def handler(request):
+            attempts.append(request)
+            if len(attempts) == 1:
+                return httpx.Response(503, json={"message": "busy"})
+            return stream_handler(sse(delta("ok"), "[DONE]"))(request)
+
+        client = make_client(handler)
+        async with client.chat_completion_stream([]) as deltas:
+            message = await collect_stream(deltas)
+        await client.aclose()
+        return message, len(attempts)
+
+    message, attempts = asyncio.run(run())
+    assert message["content"] == "ok" and attempts == 2
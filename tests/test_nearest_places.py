@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+import nomain
+from nomain import nearest_places
+
+CENTER = (52.3613, 4.918)
+
+
+def random_places(count, seed=11):
+    rng = random.Random(seed)
+    places = [{"id": i, "lat": CENTER[0] + rng.uniform(-0.01, 0.01), "lon": CENTER[1] + rng.uniform(-0.01, 0.01)}
+              for i in range(count)]
+    places[3] = {"id": 3, "name": "no coordinates"}
+    places[7] = {"id": 7, "center": {"lat": CENTER[0] + 0.0001, "lon": CENTER[1]}}
+    return places
+
+
+@pytest.mark.parametrize("limit", [5, 40, None])
+def test_numpy_and_heapq_paths_agree(monkeypatch, limit):
+    with_numpy = nearest_places(random_places(40), *CENTER, limit)
+    monkeypatch.setattr(nomain, "np", None)
+    without_numpy = nearest_places(random_places(40), *CENTER, limit)
+
+    assert [place["id"] for place in with_numpy] == [place["id"] for place in without_numpy]
+    for a, b in zip(with_numpy, without_numpy):
+        if b["distance"] is None:
+            assert a["distance"] is None
+        else:
+            assert a["distance"] == pytest.approx(b["distance"])
+
+
+def test_places_without_coordinates_come_last():
+    ranked = nearest_places(random_places(40), *CENTER)
+
+    assert ranked[0]["id"] == 7
+    assert ranked[-1]["id"] == 3 and ranked[-1]["distance"] is None
+    distances = [place["distance"] for place in ranked[:-1]]
+    assert distances == sorted(distances)
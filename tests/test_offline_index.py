@@ -0,0 +1,118 @@
+import json
+import random
+
+import pytest
+
+from nomain import OfflinePlaceIndex, RESTAURANT_AMENITIES, haversine_m
+
+
+@pytest.fixture(scope="module")
+def index(overpass_fixture):
+    return OfflinePlaceIndex.from_source(overpass_fixture, node_size=4)
+
+
+def brute_force(index, latitude, longitude, radius):
+    distances = sorted(
+        (haversine_m(latitude, longitude, place["lat"], place["lon"]), place["id"])
+        for place in index.places
+    )
+    return [place_id for distance, place_id in distances if distance <= radius]
+
+
+def result_ids(result):
+    return {place["id"] for places in result["categories"].get("amenity", {}).values() for place in places}
+
+
+def test_fixture_filters_non_restaurants_and_missing_coordinates(index, overpass_fixture):
+    with open(overpass_fixture) as f:
+        elements = json.load(f)["elements"]
+    expected = [
+        element for element in elements
+        if element["tags"].get("amenity") in RESTAURANT_AMENITIES and ("lat" in element or "center" in element)
+    ]
+    assert len(index.places) == len(expected)
+    assert all(place["tags"]["amenity"] in RESTAURANT_AMENITIES for place in index.places)
+
+
+def test_matches_brute_force_haversine(index):
+    rng = random.Random(0)
+    for _ in range(200):
+        latitude = 52.3613333 + rng.uniform(-0.01, 0.01)
+        longitude = 4.9180833 + rng.uniform(-0.015, 0.015)
+        radius = rng.choice([100, 300, 500, 1000, 2000])
+        limit = rng.choice([1, 5, 100])
+
+        result = index.find_nearby_places(latitude, longitude, radius, ["amenity"], limit)
+
+        expected = brute_force(index, latitude, longitude, radius)
+        assert result["total_count"] == min(len(expected), limit)
+        assert result_ids(result) == set(expected[:limit])
+
+
+def test_result_shape_matches_mcp_tool(index):
+    result = index.find_nearby_places(52.3613333, 4.9180833, 1000, ["amenity"], 10)
+    assert set(result) == {"query", "categories", "total_count"}
+    for subcategory, places in result["categories"]["amenity"].items():
+        assert subcategory in RESTAURANT_AMENITIES
+        assert all({"id", "name", "lat", "lon", "tags"} <= set(place) for place in places)
+
+
+def test_other_categories_are_empty(index):
+    result = index.find_nearby_places(52.3613333, 4.9180833, 1000, ["shop"], 10)
+    assert result["categories"] == {} and result["total_count"] == 0
+
+
+def test_save_load_round_trip(index, tmp_path):
+    path = tmp_path / "index.json"
+    index.save(path)
+    loaded = OfflinePlaceIndex.load(path)
+    assert loaded.places == index.places
+    assert (loaded.lats, loaded.lons, loaded.node_size) == (index.lats, index.lons, index.node_size)
+    query = (52.362, 4.919, 800, ["amenity"], 10)
+    assert loaded.find_nearby_places(*query) == index.find_nearby_places(*query)
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / "other.json"
+    path.write_text(json.dumps({"format": "something-else"}))
+    with pytest.raises(ValueError):
+        OfflinePlaceIndex.load(path)
+
+
+OSM_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6" generator="test">
+  <node id="1" version="1" lat="52.3610" lon="4.9180"><tag k="amenity" v="cafe"/><tag k="name" v="Node Cafe"/></node>
+  <node id="2" version="1" lat="52.3620" lon="4.9190"><tag k="amenity" v="bench"/></node>
+  <node id="10" version="1" lat="52.3600" lon="4.9170"/>
+  <node id="11" version="1" lat="52.3600" lon="4.9172"/>
+  <node id="12" version="1" lat="52.3602" lon="4.9172"/>
+  <node id="13" version="1" lat="52.3602" lon="4.9170"/>
+  <way id="100" version="1">
+    <nd ref="10"/><nd ref="11"/><nd ref="12"/><nd ref="13"/><nd ref="10"/>
+    <tag k="amenity" v="restaurant"/><tag k="name" v="Way Restaurant"/>
+  </way>
+  <node id="20" version="1" lat="52.3630" lon="4.9200"/>
+  <node id="21" version="1" lat="52.3630" lon="4.9204"/>
+  <node id="22" version="1" lat="52.3634" lon="4.9204"/>
+  <node id="23" version="1" lat="52.3634" lon="4.9200"/>
+  <way id="200" version="1"><nd ref="20"/><nd ref="21"/><nd ref="22"/><nd ref="23"/><nd ref="20"/></way>
+  <relation id="300" version="1">
+    <member type="way" ref="200" role="outer"/>
+    <tag k="type" v="multipolygon"/><tag k="amenity" v="pub"/><tag k="name" v="Relation Pub"/>
+  </relation>
+</osm>
+"""
+
+
+def test_osm_extract_nodes_ways_and_relations(tmp_path):
+    pytest.importorskip("osmium")
+    path = tmp_path / "extract.osm"
+    path.write_text(OSM_XML)
+
+    index = OfflinePlaceIndex.from_source(path)
+
+    by_name = {place["name"]: place for place in index.places}
+    assert set(by_name) == {"Node Cafe", "Way Restaurant", "Relation Pub"}
+    assert (by_name["Relation Pub"]["type"], by_name["Relation Pub"]["id"]) == ("relation", 300)
+    assert by_name["Relation Pub"]["lat"] == pytest.approx(52.3632, abs=1e-3)
+    assert by_name["Way Restaurant"]["tags"] == {"amenity": "restaurant", "name": "Way Restaurant"}
@@ -0,0 +1,17 @@
+import io
+import json
+
+from nomain import write_result
+
+
+def test_ndjson_output_streams_header_then_ranked_restaurants():
+    result = {"status": "success", "restaurants_found": 2,
+              "restaurants": [{"type": "node", "name": "A"}, {"type": "way", "name": "B"}]}
+    out = io.StringIO()
+
+    write_result(result, "ndjson", out)
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert lines[0] == {"record": "header", "status": "success", "restaurants_found": 2}
+    assert [(line["record"], line["rank"], line["type"], line["name"]) for line in lines[1:]] == [
+        ("restaurant", 1, "node", "A"), ("restaurant", 2, "way", "B")]
@@ -0,0 +1,28 @@
+import logging
+
+from nomain import MCPOSMClient, payload_logger
+
+
+class Unserializable:
+    pass
+
+
+def test_payloads_are_not_serialized_above_debug(caplog):
+    caplog.set_level(logging.INFO, logger=payload_logger.name)
+
+    # Serializing this would raise, so passing proves nothing was formatted
+    MCPOSMClient()._log_payload("📥 Received:", {"result": Unserializable()})
+
+    assert caplog.records == []
+
+
+def test_debug_payloads_are_truncated_and_sampled(caplog):
+    caplog.set_level(logging.DEBUG, logger=payload_logger.name)
+    message = {"result": "x" * 500}
+
+    MCPOSMClient(debug_payload_chars=50)._log_payload("📥 Received:", message)
+    MCPOSMClient(debug_payload_sample_rate=0.0)._log_payload("📥 Received:", message)
+
+    assert len(caplog.records) == 1
+    text = caplog.records[0].getMessage()
+    assert text.startswith('📥 Received: {"result":"xxx') and text.endswith("... (513 chars)")
@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from nomain import run_profiled
+
+
+async def workload():
+    async def child(delay):
+        await asyncio.sleep(delay)
+        return [bytes(1024) for _ in range(200)]
+
+    results = await asyncio.gather(*(asyncio.create_task(child(0.05)) for _ in range(4)))
+    return len(results)
+
+
+@pytest.mark.parametrize("mode, artifacts", [
+    ("cprofile", ["profile.prof", "profile.txt"]),
+    ("tracemalloc", ["tracemalloc.snapshot", "tracemalloc.txt"]),
+    ("sampling", ["stacks.folded"]),
+])
+def test_profile_modes_write_artifacts_and_task_timings(tmp_path, mode, artifacts):
+    assert run_profiled(workload(), mode, tmp_path) == 4
+
+    for name in artifacts + ["tasks.txt"]:
+        assert (tmp_path / name).stat().st_size > 0
+    tasks = (tmp_path / "tasks.txt").read_text()
+    assert "workload.<locals>.child" in tasks.splitlines()[1]
+
+
+def test_no_mode_is_plain_asyncio_run(tmp_path):
+    assert run_profiled(workload(), None, tmp_path / "unused") == 4
+    assert not (tmp_path / "unused").exists()
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import nomain
+from nomain import DEFAULT_USER_PROFILE, MistralClient, local_scores, rank_restaurants
+
+
+def hand_built_places():
+    return [
+        # Italian 40 + €€ 25 + casual 20 + vegetarian 10 + rating 4 - 0.5 km * 2
+        {"id": 1, "distance": 500, "tags": {"amenity": "restaurant", "cuisine": "italian",
+                                             "price:range": "moderate", "diet:vegetarian": "yes"}},
+        # cafe: one step cheaper 15 + casual 20 + default vegetarian 10 + 4 - 2 km * 2
+        {"id": 2, "distance": 2000, "tags": {"amenity": "cafe"}},
+        # French 40 + rating 4; €€€, fine dining and vegan-only score nothing
+        {"id": 3, "distance": 0, "tags": {"amenity": "restaurant", "cuisine": "french",
+                                           "price:range": "expensive", "diet:vegan": "only"}},
+        # 49 before a 30 km distance penalty, clamped at zero
+        {"id": 4, "distance": 30000, "tags": {"amenity": "fast_food"}},
+    ]
+
+
+def test_scores_match_calculate_restaurant_score_weights(monkeypatch):
+    expected = [98.0, 45.0, 44.0, 0.0]
+
+    assert local_scores(hand_built_places(), DEFAULT_USER_PROFILE) == pytest.approx(expected)
+    monkeypatch.setattr(nomain, "np", None)
+    assert local_scores(hand_built_places(), DEFAULT_USER_PROFILE) == pytest.approx(expected)
+
+
+def mistral(handler):
+    client = MistralClient({"MISTRAL_API_KEY": "test", "MISTRAL_REQUESTS_PER_SECOND": "1000"}, max_retries=0)
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://mistral.test")
+    return client
+
+
+def completion(content):
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def rank(handler, places, llm_timeout=1.0):
+    async def run():
+        client = mistral(handler)
+        try:
+            return await rank_restaurants(client, places, top_k=10, llm_timeout=llm_timeout)
+        finally:
+            await client.aclose()
+    return asyncio.run(run())
+
+
+def test_falls_back_to_local_order_on_bad_json_or_timeout():
+    async def slow(request):
+        await asyncio.sleep(1)
+        return completion("{}")
+
+    bad_json = rank(lambda request: completion("not json"), hand_built_places())
+    timed_out = rank(slow, hand_built_places(), llm_timeout=0.05)
+
+    for result in (bad_json, timed_out):
+        assert result["source"] == "local"
+        assert [place["id"] for place in result["rankedRestaurants"]] == [1, 2, 3, 4]
+
+
+def test_llm_order_keeps_nodes_and_ways_with_the_same_id():
+    places = [{"type": "node", "id": 1, "distance": 10, "tags": {"amenity": "restaurant"}},
+              {"type": "way", "id": 1, "distance": 20, "tags": {"amenity": "restaurant"}}]
+    prompts = []
+
+    def handler(request):
+        prompts.append(json.loads(json.loads(request.content)["messages"][1]["content"]))
+        return completion(json.dumps({"ranking": ["way/1", "node/1"], "reasoning": "ways first"}))
+
+    result = rank(handler, places)
+
+    assert [restaurant["id"] for restaurant in prompts[0]["restaurants"]] == ["node/1", "way/1"]
+    assert result["source"] == "llm"
+    assert [(place["type"], place["id"]) for place in result["rankedRestaurants"]] == [("way", 1), ("node", 1)]
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+
+from nomain import RestaurantService
+
+
+def run_service(offline_index_path, scenario):
+
+    async def run():
+        service = await RestaurantService(radius=800, limit=5, offline_index=offline_index_path).start(port=0)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{service.port}") as client:
+                return await scenario(client)
+        finally:
+            await service.close()
+
+    return asyncio.run(run())
+
+
+def test_nearby_and_rank_share_one_connection(offline_index_path):
+    async def scenario(client):
+        nearby = await client.get("/nearby", params={"lat": 52.3613, "lon": 4.918, "limit": 3})
+        ranked = await client.post("/rank", json={"restaurants": nearby.json()["restaurants"], "topK": 2})
+        searched = await client.post("/rank", json={"latitude": 52.3613, "longitude": 4.918})
+        return nearby, ranked, searched
+
+    nearby, ranked, searched = run_service(offline_index_path, scenario)
+
+    assert nearby.status_code == 200
+    distances = [place["distance"] for place in nearby.json()["restaurants"]]
+    assert len(distances) == 3 and distances == sorted(distances)
+    assert ranked.status_code == 200 and ranked.json()["source"] == "local"
+    assert len(ranked.json()["rankedRestaurants"]) == 2
+    assert searched.json()["status"] == "success" and searched.json()["restaurants_found"] == 5
+
+
+def test_rejects_bad_requests(offline_index_path):
+    async def scenario(client):
+        return [
+            await client.get("/nearby", params={"lat": "north"}),
+            await client.get("/rank"),
+            await client.post("/rank", content=b"[1, 2]"),
+            await client.get("/missing"),
+        ]
+
+    statuses = [response.status_code for response in run_service(offline_index_path, scenario)]
+
+    assert statuses == [400, 405, 400, 404]
+
+
+def test_close_finishes_with_an_idle_keep_alive_connection(offline_index_path):
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        errors = []
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+        service = await RestaurantService(offline_index=offline_index_path).start(port=0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+        writer.write(b"GET /health HTTP/1.1\r\nHost: test\r\n\r\n")
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        await reader.readexactly(length)
+
+        # The connection stays open and idle while the service shuts down
+        await asyncio.wait_for(service.close(drain_timeout=2.0), 3.0)
+        eof = await asyncio.wait_for(reader.read(), 1.0)
+        writer.close()
+        return head, eof, errors
+
+    head, eof, errors = asyncio.run(run())
+
+    assert head.startswith(b"HTTP/1.1 200") and b"keep-alive" in head
+    assert eof == b""
+    assert errors == []
+
+
+def test_negative_content_length_is_rejected(offline_index_path):
+
+    async def run():
+        service = await RestaurantService(offline_index=offline_index_path).start(port=0)
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+            writer.write(b"POST /rank HTTP/1.1\r\nHost: test\r\nContent-Length: -5\r\n\r\n{}")
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 2.0)
+            writer.close()
+            return response
+        finally:
+            await service.close()
+
+    assert asyncio.run(run()).startswith(b"HTTP/1.1 400")
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from nomain import SingleFlight, call_key
+
+
+def test_call_key_ignores_argument_order():
+    assert call_key("t", {"a": 1, "b": [1, 2]}) == call_key("t", {"b": [1, 2], "a": 1})
+    assert call_key("t", {"a": 1}) != call_key("t", {"a": 2})
+
+
+def test_concurrent_calls_share_one_task():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"value": 42}
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(10)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(run())
+    assert calls == 1
+    assert flight.coalesced == 9
+    assert all(result is results[0] for result in results)
+    assert flight._calls == {}
+
+
+def test_one_waiter_cancelling_does_not_cancel_others():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == "done"
+
+
+def test_caller_after_last_waiter_cancelled_starts_fresh_task():
+    async def run():
+        flight = SingleFlight()
+        started = 0
+
+        async def work():
+            nonlocal started
+            started += 1
+            await asyncio.sleep(0.02)
+            return started
+
+        first = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.001)
+        first.cancel()
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flight.do("k", work))
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == 2
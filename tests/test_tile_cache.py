@@ -0,0 +1,95 @@
+import asyncio
+import json
+import random
+
+from nomain import NearbyPlacesTileCache, haversine_m
+
+CENTER = (52.3613, 4.918)
+
+
+class FakeClient:
+    """Answers find_nearby_places like the server: nearest first within radius, truncated to limit"""
+
+    def __init__(self, places):
+        self.places = places
+        self.calls = []
+
+    async def call_tool(self, name, arguments, timeout=None):
+        self.calls.append(arguments)
+        lat, lon, radius = arguments["latitude"], arguments["longitude"], arguments["radius"]
+        inside = sorted((haversine_m(lat, lon, place["lat"], place["lon"]), place) for place in self.places
+                        if haversine_m(lat, lon, place["lat"], place["lon"]) <= radius)
+        chosen = [place for _, place in inside[:arguments["limit"]]]
+        payload = {"categories": {"amenity": {"restaurant": chosen}} if chosen else {}}
+        return {"result": {"content": [{"type": "text", "text": json.dumps(payload)}]}}
+
+
+def make_places(count, spread=0.01, seed=3):
+    rng = random.Random(seed)
+    return [{"id": i, "lat": CENTER[0] + rng.uniform(-spread, spread), "lon": CENTER[1] + rng.uniform(-spread, spread)}
+            for i in range(count)]
+
+
+def ids(result):
+    return [place["id"] for places in result["categories"].get("amenity", {}).values() for place in places]
+
+
+def expected_ids(places, lat, lon, radius, limit):
+    inside = sorted((haversine_m(lat, lon, place["lat"], place["lon"]), place["id"]) for place in places)
+    return [place_id for distance, place_id in inside if distance <= radius][:limit]
+
+
+def query(cache, client, lat, lon, radius=400, limit=10):
+    return asyncio.run(cache.find_nearby_places(client, lat, lon, radius, ["amenity"], limit))
+
+
+def test_queries_are_answered_by_unioning_tiles():
+    places = make_places(150)
+    client = FakeClient(places)
+    cache = NearbyPlacesTileCache()
+
+    first = query(cache, client, *CENTER)
+    second = query(cache, client, CENTER[0] + 0.002, CENTER[1] + 0.002)
+    repeat = query(cache, client, *CENTER)
+
+    assert ids(first) == expected_ids(places, *CENTER, 400, 10)
+    assert ids(second) == expected_ids(places, CENTER[0] + 0.002, CENTER[1] + 0.002, 400, 10)
+    assert ids(repeat) == ids(first)
+    assert len(client.calls) == 2 and cache.hits > 0
+
+
+def tile_center(row, col, size=0.005):
+    return (row + 0.5) * size, (col + 0.5) * size
+
+
+def test_tiles_expire_and_least_recently_used_are_evicted(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("nomain.time.monotonic", lambda: now[0])
+    client = FakeClient(make_places(50))
+    cache = NearbyPlacesTileCache(ttl=60, max_tiles=2)
+    a, b, c = tile_center(10472, 983), tile_center(10473, 984), tile_center(10474, 985)
+
+    # Each query covers exactly one tile; refreshing A makes B the least recently used
+    for point in (a, b, a, c):
+        query(cache, client, *point, radius=50)
+    assert [tile for _, tile in cache._tiles] == [(10472, 983), (10474, 985)]
+    assert len(client.calls) == 3
+
+    query(cache, client, *a, radius=50)
+    assert len(client.calls) == 3
+    now[0] += 61
+    query(cache, client, *a, radius=50)
+    assert len(client.calls) == 4
+
+
+def test_truncated_tile_fetch_falls_back_to_a_direct_query():
+    places = make_places(400, spread=0.004)
+    client = FakeClient(places)
+    cache = NearbyPlacesTileCache(tile_fetch_limit=50)
+
+    result = query(cache, client, *CENTER, radius=300, limit=5)
+
+    assert ids(result) == expected_ids(places, *CENTER, 300, 5)
+    direct = client.calls[-1]
+    assert (direct["latitude"], direct["longitude"], direct["limit"]) == (*CENTER, 5)
+    assert not cache._tiles
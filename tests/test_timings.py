@@ -0,0 +1,34 @@
+import asyncio
+import random
+
+from nomain import LatencyHistogram, StageTimer
+
+
+def test_percentiles_stay_within_one_percent_of_exact():
+    rng = random.Random(7)
+    samples = sorted(rng.lognormvariate(-4, 1.2) for _ in range(20000))
+    histogram = LatencyHistogram()
+    for sample in samples:
+        histogram.record(sample)
+
+    for q in (50, 95, 99):
+        exact = samples[int(len(samples) * q / 100) - 1]
+        assert abs(histogram.percentile(q) - exact) <= exact * 0.01 + 1e-6
+    assert histogram.count == 20000 and len(histogram.buckets) < 3000
+
+
+def test_spans_aggregate_per_stage_including_concurrent_ones():
+    timer = StageTimer()
+
+    async def run():
+        with timer.span("initialize"):
+            await asyncio.sleep(0.01)
+        await asyncio.gather(timer.timed("list_tools", asyncio.sleep(0)),
+                             timer.timed("list_tools", asyncio.sleep(0)))
+
+    asyncio.run(run())
+    summary = timer.summary()
+
+    assert summary["initialize"]["count"] == 1 and summary["initialize"]["p50_ms"] >= 10
+    assert summary["list_tools"]["count"] == 2
+    assert timer.report().splitlines()[1].startswith("initialize")
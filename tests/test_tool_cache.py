@@ -0,0 +1,48 @@
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from nomain import MCPOSMClient, ToolCatalogCache, parse_tool_text
+
+STUB = (sys.executable, str(Path(__file__).resolve().parent / "stub_mcp_server.py"))
+SERVER = {"name": "stub-mcp", "version": "1.0"}
+
+
+def test_entries_expire_and_legacy_lists_are_stale(tmp_path, monkeypatch):
+    cache = ToolCatalogCache(tmp_path / "tools.json", ttl=60)
+    cache.store(SERVER, [{"name": "echo"}])
+    assert cache.load(SERVER) == [{"name": "echo"}]
+
+    now = time.time()
+    monkeypatch.setattr("nomain.time.time", lambda: now + 61)
+    assert cache.load(SERVER) is None
+
+    (tmp_path / "tools.json").write_text(json.dumps({"stub-mcp@1.0": [{"name": "echo"}]}))
+    assert cache.load(SERVER) is None
+
+
+def test_stale_cached_catalogue_is_refetched_once(tmp_path):
+    cache = ToolCatalogCache(tmp_path / "tools.json")
+    cache.store(SERVER, [{"name": "find_nearby_places", "inputSchema": {}}])
+
+    async def run():
+        client = MCPOSMClient(command=STUB)
+        assert await client.connect_to_server()
+        await client.initialize()
+        try:
+            await client.get_tools(cache)
+            result = parse_tool_text(await client.call_tool("echo", {"value": "new tool"}))
+            with pytest.raises(ValueError, match="Unknown MCP tool"):
+                await client.call_tool("removed_tool", {})
+            return result
+        finally:
+            await client.close()
+
+    result = asyncio.run(run())
+
+    assert result["value"] == "new tool"
+    assert [tool["name"] for tool in cache.load(SERVER)] == ["echo"]